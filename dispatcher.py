@@ -3,6 +3,7 @@
 from __future__ import annotations
 
 import argparse
+import re
 import subprocess
 import sys
 from pathlib import Path
@@ -16,26 +17,31 @@ from export_excel_poc import main as export_excel_main, parse_args as parse_exce
 DEFAULT_OUTPUT_ROOT = Path("result")
 CONVERTED_DIR_NAME = "converted"
 PREPROCESSED_DIR_NAME = "preprocessed"
+# yomi_formats/json のファイル名からページ番号（page_NNN）を取り出す
+JSON_PAGE_PATTERN = re.compile(r"page_(\d{3})")
 
 
-def _parse_cli_value(args: list[str] | None, name: str) -> str | None:
-    """CLI 引数リストから `--name value` または `--name=value` を抽出する。"""
+def _parse_cli_values(args: list[str] | None, names: tuple[str, ...]) -> dict[str, str | None]:
+    """CLI 引数リストから `--name value` / `--name=value` を 1 回の走査でまとめて抽出する。
 
+    同じオプションが複数回ある場合は先勝ち。値が欠けている場合は None。
+    """
+
+    values: dict[str, str | None] = {}
     if not args:
-        return None
+        return values
     for index, item in enumerate(args):
-        if item == name:
-            if index + 1 < len(args):
-                return args[index + 1]
-            return None
-        prefix = f"{name}="
-        if item.startswith(prefix):
-            return item[len(prefix) :]
-    return None
-
-
-def _parse_cli_int(args: list[str] | None, name: str) -> int | None:
-    value = _parse_cli_value(args, name)
+        if item in names:
+            if item not in values:
+                values[item] = args[index + 1] if index + 1 < len(args) else None
+            continue
+        name, sep, value = item.partition("=")
+        if sep and name in names and name not in values:
+            values[name] = value
+    return values
+
+
+def _parse_cli_int(value: str | None) -> int | None:
     if value is None:
         return None
     try:
@@ -48,12 +54,13 @@ def _infer_pdf_output_dir(pdf_path: Path, *, output_root: Path, extra_args: list
     """ocr_chanked.py の出力ディレクトリ名ルールに合わせて output_dir を推定する。"""
 
     stem = pdf_path.stem
-    label = _parse_cli_value(extra_args, "--label")
+    options = _parse_cli_values(extra_args, ("--label", "--start", "--end"))
+    label = options.get("--label")
     if label:
         return output_root / f"{stem}_{label}"
 
-    start = _parse_cli_int(extra_args, "--start")
-    end = _parse_cli_int(extra_args, "--end")
+    start = _parse_cli_int(options.get("--start"))
+    end = _parse_cli_int(options.get("--end"))
 
     candidates: list[Path] = []
 
@@ -191,13 +198,14 @@ def parse_args() -> argparse.Namespace:
     # そのまま ocr_chanked.py に渡すと argparse がオプション解析を停止してしまうため、
     # 明示的に `--` で分割してから parse_args する。
     argv = sys.argv[1:]
-    passthrough: list[str] = []
-    if "--" in argv:
+    try:
         sep_index = argv.index("--")
+    except ValueError:
+        known_argv = argv
+        passthrough: list[str] = []
+    else:
         known_argv = argv[:sep_index]
         passthrough = argv[sep_index + 1 :]
-    else:
-        known_argv = argv
 
     args = parser.parse_args(known_argv)
     args.extra = passthrough
@@ -486,8 +494,6 @@ def _convert_to_excel(
 ) -> None:
     """yomi_formats/json 内の JSON を集めて Excel に変換する。"""
 
-    import re
-
     json_dir = output_dir / "yomi_formats" / "json"
     json_files: list[Path] = []
     if json_dir.exists():
@@ -510,7 +516,7 @@ def _convert_to_excel(
     for json_path in json_files:
         try:
             page_image_path = None
-            match = re.search(r"page_(\d{3})", json_path.name)
+            match = JSON_PAGE_PATTERN.search(json_path.name)
             if match:
                 page_no = int(match.group(1))
                 candidate = output_dir / "page_images" / f"page_{page_no:03}.png"
@@ -576,7 +582,6 @@ def _convert_to_csv(output_dir: Path, *, excel_mode: str) -> None:
     """yomi_formats/json 内の JSON を集めて CSV（結合解除＋分割）に変換する。"""
 
     import csv
-    import re
 
     json_dir = output_dir / "yomi_formats" / "json"
     json_files: list[Path] = []
@@ -598,7 +603,7 @@ def _convert_to_csv(output_dir: Path, *, excel_mode: str) -> None:
     for json_path in json_files:
         try:
             page_image_path = None
-            match = re.search(r"page_(\d{3})", json_path.name)
+            match = JSON_PAGE_PATTERN.search(json_path.name)
             if match:
                 page_no = int(match.group(1))
                 candidate = output_dir / "page_images" / f"page_{page_no:03}.png"
@@ -16,12 +16,14 @@ TEX_TEXT_COMMAND_PATTERN = re.compile(r"\\text\{([^}]*)\}")
 TEX_COMMAND_PATTERN = re.compile(r"\\[A-Za-z]+")
 TEX_FRACTION_PATTERN = re.compile(r"\\frac\{([^{}]+)\}\{([^{}]+)\}")
 TEX_SUB_SUP_PATTERN = re.compile(r"([A-Za-z]+)\s*[_^]\s*\{?(\d+)\}?")
+TEX_TRIGGER_CHARS = "$\\{}_^"
 
 TABLE_RULE = re.compile(r"^:?-{3,}:?$")
 IMG_HTML_PATTERN = re.compile(r"<img[^>]*src=\"([^\"]+)\"[^>]*>")
 IMG_MD_PATTERN = re.compile(r"!\[[^\]]*\]\(([^)]+)\)")
 WIDTH_PATTERN = re.compile(r"width\s*=\s*\"?([0-9]+(?:\.[0-9]+)?)(px|cm|mm)?\"?")
 PAGE_HEADING_PATTERN = re.compile(r"^#\s+Page\s+(?P<page>\d+)\s*$")
+ORDERED_ITEM_PATTERN = re.compile(r"(\d+)[\.\)]\s+(.*)")
 
 
 def read_markdown(path: Path) -> list[str]:
@@ -75,13 +77,15 @@ def add_table(document: Document, table_lines: list[str]) -> None:
     table = document.add_table(rows=len(cleaned), cols=cols)
     table.style = "Table Grid"
 
-    for r_idx, row in enumerate(cleaned):
+    # table.rows / row.cells は参照のたびに XML からセル一覧を組み立て直すので、行ごとに 1 回だけ取る
+    for table_row, row in zip(table.rows, cleaned):
+        cells = table_row.cells
         for c_idx in range(cols):
             value = row[c_idx] if c_idx < len(row) else ""
             text = value.replace("<br>", "\n").strip()
             if text == "-":
                 text = ""
-            table.rows[r_idx].cells[c_idx].text = text
+            cells[c_idx].text = text
 
 
 def flush_paragraph(document: Document, buffer: list[str], base_dir: Path | None = None) -> None:
@@ -98,24 +102,25 @@ def flush_paragraph(document: Document, buffer: list[str], base_dir: Path | None
 def strip_tex_math_delimiters(text: str) -> str:
     """docx 出力向けに、TeX デリミタだけ除去して中身をそのまま残す。"""
 
-    def strip_inline(match: re.Match[str]) -> str:
-        return match.group("body")
-
     stripped = text.strip()
     if stripped == "$$":
         return ""
 
+    # 以降のどの置換も $ \ { } _ ^ のいずれかが無いと起こらないので、数式の無い行はそのまま返す
+    if not any(ch in text for ch in TEX_TRIGGER_CHARS):
+        return text
+
     text = text.replace("\\[", "").replace("\\]", "")
     text = text.replace("\\(", "").replace("\\)", "")
     text = TEX_BLOCK_INLINE_PATTERN.sub(lambda m: m.group("body").strip(), text)
-    prev = None
-    while prev != text:
-        prev = text
-        text = TEX_INLINE_PATTERN.sub(strip_inline, text)
-
-    text = TEX_TEXT_COMMAND_PATTERN.sub(lambda m: m.group(1), text)
-    text = TEX_FRACTION_PATTERN.sub(lambda m: f"({m.group(1)})/({m.group(2)})", text)
-    text = TEX_SUB_SUP_PATTERN.sub(lambda m: f"{m.group(1)}_{m.group(2)}", text)
+    # 置換のたびに "$" が 2 つ減るので、置換件数 0 で不動点（前回との全文比較はしない）
+    replaced = 1
+    while replaced and "$" in text:
+        text, replaced = TEX_INLINE_PATTERN.subn(r"\g<body>", text)
+
+    text = TEX_TEXT_COMMAND_PATTERN.sub(r"\1", text)
+    text = TEX_FRACTION_PATTERN.sub(r"(\1)/(\2)", text)
+    text = TEX_SUB_SUP_PATTERN.sub(r"\1_\2", text)
     text = text.replace("{", "").replace("}", "")
     text = TEX_COMMAND_PATTERN.sub("", text)
     return text
@@ -171,6 +176,8 @@ class MathRegion:
 
 
 JSON_PAGE_PATTERN = re.compile(r"(?:^|_)page_(\d{3})(?:_|$)")
+IMAGE_PAGE_PATTERN = re.compile(r"page(?:_images)?_page_(\d{3})")
+LOOSE_PAGE_PATTERN = re.compile(r"page_(\d{3})")
 URL_PATTERN = re.compile(r"https?://", re.IGNORECASE)
 BASE_PATTERN = re.compile(r"\([0-9]{1,3}\)\s*[0-9]{0,3}")  # (10), (12) 等
 SUB_SUP_PATTERN = re.compile(r"[_^][0-9]+")
@@ -181,10 +188,10 @@ def _extract_page_number(name: str) -> int | None:
     match = JSON_PAGE_PATTERN.search(name)
     if match:
         return int(match.group(1))
-    match = re.search(r"page(?:_images)?_page_(\d{3})", name)
+    match = IMAGE_PAGE_PATTERN.search(name)
     if match:
         return int(match.group(1))
-    match = re.search(r"page_(\d{3})", name)
+    match = LOOSE_PAGE_PATTERN.search(name)
     if match:
         return int(match.group(1))
     return None
@@ -415,7 +422,7 @@ def convert_markdown(
             i += 1
             continue
 
-        ordered_match = re.match(r"(\d+)[\.\)]\s+(.*)", normalized)
+        ordered_match = ORDERED_ITEM_PATTERN.match(normalized)
         if ordered_match:
             flush_paragraph(document, paragraph_buffer, base_dir)
             number_text = ordered_match.group(1)
@@ -20,7 +20,7 @@ from openpyxl.worksheet.datavalidation import DataValidation
 from plain_text import to_plain_text
 
 
-@dataclass
+@dataclass(slots=True)
 class TableCell:
     row: int
     col: int
@@ -45,6 +45,8 @@ SYMBOL_NORMALIZE = {
     "□": "□",
     "●": "●",
 }
+# 正規化後の記号（判定のたびに dict.values() を線形走査しないよう set にしておく）
+SYMBOL_NORMALIZED_VALUES = frozenset(SYMBOL_NORMALIZE.values())
 
 _FILENAME_INVALID_RE = re.compile(r'[<>:"/\\\\|?*\\x00-\\x1F]')
 
@@ -238,7 +240,7 @@ def _ocr_symbol_tesseract(img: Image.Image) -> str | None:
     if text:
         ch = next((c for c in text if not c.isspace()), "")
         ch = SYMBOL_NORMALIZE.get(ch, ch)
-        if ch in SYMBOL_WHITELIST or ch in SYMBOL_NORMALIZE.values():
+        if ch in SYMBOL_WHITELIST or ch in SYMBOL_NORMALIZED_VALUES:
             return ch
 
     # OCR が空でも、輪郭記号（○/□）は画像処理で補完
@@ -669,14 +671,17 @@ def _is_blank_row(values_row: list[str]) -> bool:
 
 def _extract_table_segments_by_structure(
     cells: list[TableCell],
+    *,
+    grids: tuple[list[list[int | None]], list[list[str]]] | None = None,
 ) -> list[tuple[list[int], list[int], int, int]]:
     """セル構造の変化に基づき「ヘッダー行群 + データ行群」のセグメントへ分割する。
 
     戻り値: [(header_rows, data_rows, max_row, max_col), ...]
     header_rows/data_rows は 1 起点の行番号配列。
+    grids に _build_owner_and_value_grids の結果を渡すと再構築を省略する。
     """
 
-    owner, values = _build_owner_and_value_grids(cells)
+    owner, values = grids if grids is not None else _build_owner_and_value_grids(cells)
     max_row = len(owner)
     max_col = len(owner[0]) if owner else 0
 
@@ -693,10 +698,13 @@ def _extract_table_segments_by_structure(
             if not t:
                 continue
             t = SYMBOL_NORMALIZE.get(t, t)
-            if t in SYMBOL_WHITELIST or t in SYMBOL_NORMALIZE.values():
+            if t in SYMBOL_WHITELIST or t in SYMBOL_NORMALIZED_VALUES:
                 return True
         return False
 
+    # 記号判定は行ごとに 1 回だけ行い、run の走査では結果を引く
+    symbol_rows = [sig is not None and row_has_symbol(values[r]) for r, sig in enumerate(signatures)]
+
     # まずは「行の構造（signature）」が連続する run にまとめる（空行は区切り）。
     runs: list[list[int]] = []
     current: list[int] = []
@@ -721,16 +729,14 @@ def _extract_table_segments_by_structure(
     if not runs:
         return []
 
-    has_any_symbol = any(
-        row_has_symbol(values[r - 1]) for r in range(1, max_row + 1) if signatures[r - 1] is not None
-    )
+    has_any_symbol = any(symbol_rows)
 
     segments: list[tuple[list[int], list[int], int, int]] = []
     pending_header: list[int] = []
 
     if has_any_symbol:
         for rows in runs:
-            first_symbol = next((r for r in rows if row_has_symbol(values[r - 1])), None)
+            first_symbol = next((r for r in rows if symbol_rows[r - 1]), None)
             if first_symbol is None:
                 pending_header.extend(rows)
                 continue
@@ -828,9 +834,10 @@ def write_tables_to_workbook_table_mode(
     for table_cells in tables:
         if not table_cells:
             continue
-        _, values = _build_owner_and_value_grids(table_cells)
+        grids = _build_owner_and_value_grids(table_cells)
+        values = grids[1]
         max_col = len(values[0]) if values else 0
-        segments = _extract_table_segments_by_structure(table_cells)
+        segments = _extract_table_segments_by_structure(table_cells, grids=grids)
         if not segments:
             continue
 
@@ -963,7 +970,8 @@ def write_tables_to_csv_files(
         if not table_cells:
             continue
 
-        _, values = _build_owner_and_value_grids(table_cells)
+        grids = _build_owner_and_value_grids(table_cells)
+        values = grids[1]
         max_row = len(values)
         max_col = len(values[0]) if values else 0
 
@@ -993,7 +1001,7 @@ def write_tables_to_csv_files(
             outputs.append(out_path)
             continue
 
-        segments = _extract_table_segments_by_structure(table_cells)
+        segments = _extract_table_segments_by_structure(table_cells, grids=grids)
         if not segments:
             continue
 
@@ -7,6 +7,7 @@ OCR steps can treat every asset as a regular raster image.
 from __future__ import annotations
 
 from dataclasses import dataclass
+from functools import lru_cache
 from pathlib import Path
 
 
@@ -67,20 +68,26 @@ def ensure_png_image(
     return ImageConversionResult(source=source, converted=target, performed=True)
 
 
-def _convert_heic_to_png(source: Path, target: Path) -> None:
+@lru_cache(maxsize=None)
+def _register_heif_opener() -> None:
+    """pillow-heif の opener 登録（libheif の初期化を含む）はプロセスで 1 回だけ行う。"""
     try:
         from pillow_heif import register_heif_opener
     except ImportError as exc:  # pragma: no cover - dependency missing is fatal
         raise ImageConversionError("pillow-heif がインストールされていません") from exc
 
+    register_heif_opener()
+
+
+def _convert_heic_to_png(source: Path, target: Path) -> None:
     from PIL import Image
 
-    register_heif_opener()
+    _register_heif_opener()
 
     try:
         with Image.open(source) as image:
-            image.load()
-            image.save(target, format="PNG")
+            # 変換後の PNG は OCR/前処理の中間ファイルなので、圧縮率より書き出し速度を優先する
+            image.save(target, format="PNG", compress_level=1)
     except Exception as exc:  # pragma: no cover - pillow_heif errors depend on file contents
         raise ImageConversionError(f"HEIC 変換に失敗しました: {exc}") from exc
 
@@ -2,11 +2,14 @@
 
 from __future__ import annotations
 
+import os
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass, replace
+from functools import lru_cache
 from pathlib import Path
 from typing import Iterable, Mapping
 
-from PIL import Image, ImageEnhance, ImageFilter, ImageOps, ImageStat
+from PIL import Image, ImageEnhance, ImageFilter, ImageOps
 import numpy as np
 import argparse
 
@@ -52,15 +55,20 @@ def _ensure_mode(image: Image.Image, *, grayscale: bool, keep_color: bool) -> Im
     return image.convert("RGB")
 
 
+@lru_cache(maxsize=16)
+def _gamma_lut(gamma: float, bands: int) -> tuple[int, ...]:
+    """ガンマ補正の LUT。プロファイルの gamma は固定値なので、ページごとに作り直さず使い回す。"""
+    lut = [min(255, int((i / 255.0) ** (1.0 / gamma) * 255 + 0.5)) for i in range(256)]
+    return tuple(lut * bands)
+
+
 def _apply_enhancements(image: Image.Image, profile: ImagePreprocessProfile) -> Image.Image:
     if profile.brightness != 1.0:
         image = ImageEnhance.Brightness(image).enhance(profile.brightness)
     if profile.contrast != 1.0:
         image = ImageEnhance.Contrast(image).enhance(profile.contrast)
     if profile.gamma and profile.gamma > 0:
-        gamma = profile.gamma
-        lut = [min(255, int((i / 255.0) ** (1.0 / gamma) * 255 + 0.5)) for i in range(256)]
-        image = image.point(lut * (3 if image.mode == "RGB" else 1))
+        image = image.point(_gamma_lut(profile.gamma, 3 if image.mode == "RGB" else 1))
     if profile.clahe:
         # 簡易 CLAHE: OpenCV を使わず PIL+numpy でチャネルごとに適用
         image = _apply_clahe(image)
@@ -81,8 +89,9 @@ def _apply_enhancements(image: Image.Image, profile: ImagePreprocessProfile) ->
 
 def _binarize(image: Image.Image) -> Image.Image:
     gray = image.convert("L") if image.mode != "L" else image
-    stats = ImageStat.Stat(gray)
-    mid = stats.median[0]
+    # ImageStat.median と同じ定義（累積度数が半数を超える最初の階調）を、C 実装のヒストグラムと numpy で求める
+    cumulative = np.cumsum(gray.histogram())
+    mid = min(255, int(np.searchsorted(cumulative, cumulative[-1] // 2, side="right")))
     threshold = max(110, min(200, int(mid + 10)))
     return gray.point(lambda x: 255 if x > threshold else 0, mode="1").convert("L")
 
@@ -110,6 +119,24 @@ def _apply_clahe(image: Image.Image, clip_limit: float = 2.0, grid_size: int = 8
     return Image.fromarray(out, mode="L")
 
 
+def _render_variant(
+    base: Image.Image,
+    profile: ImagePreprocessProfile,
+    output_dir: Path,
+    page_number: int,
+) -> Path:
+    # convert は常に新しい画像を返すので base は書き換わらない（スレッド間で共有できる）
+    image = _ensure_mode(base, grayscale=profile.grayscale, keep_color=profile.keep_color)
+    image = _apply_enhancements(image, profile)
+    if profile.binarize:
+        image = _binarize(image)
+    variant_dir = output_dir / profile.key
+    variant_dir.mkdir(parents=True, exist_ok=True)
+    variant_path = variant_dir / f"page_{page_number:03d}.png"
+    image.save(variant_path, format="PNG", optimize=True)
+    return variant_path
+
+
 def preprocess_image_variants(
     source: Path,
     output_dir: Path,
@@ -130,20 +157,22 @@ def preprocess_image_variants(
         base = ImageOps.exif_transpose(base)
         if max_long_edge:
             base = resize_long_edge(base, max_long_edge)
-        variants: dict[str, Path] = {}
-        for profile in profile_list:
-            image = base.copy()
-            image = _ensure_mode(image, grayscale=profile.grayscale, keep_color=profile.keep_color)
-            image = _apply_enhancements(image, profile)
-            if profile.binarize:
-                image = _binarize(image)
-            variant_dir = output_dir / profile.key
-            variant_dir.mkdir(parents=True, exist_ok=True)
-            variant_path = variant_dir / f"page_{page_number:03d}.png"
-            image.save(variant_path, format="PNG", optimize=True)
-            variants[profile.key] = variant_path
-
-    return variants
+        # 遅延読み込みのままスレッドから同時に触らないよう、先にデコードしておく
+        base.load()
+        if len(profile_list) == 1:
+            paths = [_render_variant(base, profile_list[0], output_dir, page_number)]
+        else:
+            # フィルタや PNG 圧縮の間は Pillow が GIL を手放すので、プロファイルごとにスレッドで並列化する
+            workers = min(len(profile_list), os.cpu_count() or 1)
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                paths = list(
+                    pool.map(
+                        lambda profile: _render_variant(base, profile, output_dir, page_number),
+                        profile_list,
+                    )
+                )
+
+    return {profile.key: path for profile, path in zip(profile_list, paths)}
 
 
 OCR_DEFAULT_PROFILE = ImagePreprocessProfile(
@@ -29,6 +29,33 @@ TEX_TEXT_COMMAND_PATTERN = re.compile(r"\\text\{([^}]*)\}")
 TEX_COMMAND_PATTERN = re.compile(r"\\[A-Za-z]+")
 TEX_FRACTION_PATTERN = re.compile(r"\\frac\{([^{}]+)\}\{([^{}]+)\}")
 TEX_SUB_SUP_PATTERN = re.compile(r"([A-Za-z]+)\s*[_^]\s*\{?(\d+)\}?")
+TEX_TRIGGER_CHARS = "$\\{}_^"
+NUMBERED_HEADING_PATTERN = re.compile(r"^(#+)\s+\$(\d+(?:-\d+)+)\$\s*(.*)$")
+BR_SPACING_PATTERN = re.compile(r"\s*<br>\s*")
+IMG_TRAILING_NEWLINES_PATTERN = re.compile(r"(<img[^>]+>)\s*\n+")
+EXTRA_BLANK_LINES_PATTERN = re.compile(r"\n{3,}")
+# recover_html_tokens / finalize_html_tokens で順に適用する (パターン, 置換) の組。行ごとに呼ばれるので事前にコンパイルしておく
+BARE_TAG_FIXES = tuple(
+    (re.compile(rf"(?<!<){tag}(?!>)", re.IGNORECASE), f"<{tag}>") for tag in BARE_TAGS
+)
+HTML_TOKEN_FIXES = (
+    # img タグに紛れ込んだ <br> を外に出す
+    (re.compile(r"<img([^>]*?)<br>[^>]*>", re.IGNORECASE), r"<img\1><br>"),
+    # img の閉じ > を保証
+    (re.compile(r"(<img[^>\n]*)(?<!/)>?", re.IGNORECASE), r"\1>"),
+    # details/summary の閉じタグを修正
+    (re.compile(r"\$\$\s*/details\s*\$\$", re.IGNORECASE), "</details>"),
+    (re.compile(r"(?<!<)/details(?!>)", re.IGNORECASE), "</details>"),
+    (re.compile(r"(?<!<)details(?!>)", re.IGNORECASE), "<details>"),
+    (re.compile(r"(?<!<)/summary(?!>)", re.IGNORECASE), "</summary>"),
+    (re.compile(r"<summary>([^<]*?)/<summary>", re.IGNORECASE), r"<summary>\1</summary>"),
+)
+PLACEHOLDER_TAG_FIXES = (
+    (re.compile(r"\$\$\s*/details\s*\$\$", re.IGNORECASE), "</details>"),
+    (re.compile(r"\$\$\s*details\s*\$\$", re.IGNORECASE), "<details>"),
+    (re.compile(r"\$\$\s*/summary\s*\$\$", re.IGNORECASE), "</summary>"),
+    (re.compile(r"\$\$\s*summary\s*\$\$", re.IGNORECASE), "<summary>"),
+)
 
 
 def clean_text(line: str) -> str:
@@ -36,7 +63,7 @@ def clean_text(line: str) -> str:
     stripped = text.strip()
     if stripped == "$$":
         return ""
-    text = UNESCAPE_PATTERN.sub(lambda m: m.group(1), text)
+    text = UNESCAPE_PATTERN.sub(r"\1", text)
     text = EXTRA_BACKSLASH_PATTERN.sub(r"\\", text)
     text = text.replace("’", "'")
     contains_url = bool(URL_PATTERN.search(text))
@@ -61,20 +88,21 @@ MEDIA_TOKENS = ("://", "./", ".png", ".jpg", ".jpeg", ".gif", "figures/", "page_
 def strip_tex_math_delimiters(text: str) -> str:
     """LaTeX/TeX の数式デリミタやコマンドを「表示用の素の文字列」に寄せる。"""
 
-    def strip_inline(match: Match[str]) -> str:
-        return match.group("body")
+    # 以降のどの置換も $ \ { } _ ^ のいずれかが無いと起こらないので、数式の無い行はそのまま返す
+    if not any(ch in text for ch in TEX_TRIGGER_CHARS):
+        return text
 
     text = text.replace("\\[", "").replace("\\]", "")
     text = text.replace("\\(", "").replace("\\)", "")
     text = TEX_BLOCK_INLINE_PATTERN.sub(lambda m: m.group("body").strip(), text)
-    prev = None
-    while prev != text:
-        prev = text
-        text = TEX_INLINE_PATTERN.sub(strip_inline, text)
-
-    text = TEX_TEXT_COMMAND_PATTERN.sub(lambda m: m.group(1), text)
-    text = TEX_FRACTION_PATTERN.sub(lambda m: f"({m.group(1)})/({m.group(2)})", text)
-    text = TEX_SUB_SUP_PATTERN.sub(lambda m: f"{m.group(1)}_{m.group(2)}", text)
+    # 置換のたびに "$" が 2 つ減るので、置換件数 0 で不動点（前回との全文比較はしない）
+    replaced = 1
+    while replaced and "$" in text:
+        text, replaced = TEX_INLINE_PATTERN.subn(r"\g<body>", text)
+
+    text = TEX_TEXT_COMMAND_PATTERN.sub(r"\1", text)
+    text = TEX_FRACTION_PATTERN.sub(r"(\1)/(\2)", text)
+    text = TEX_SUB_SUP_PATTERN.sub(r"\1_\2", text)
     text = text.replace("{", "").replace("}", "")
     text = TEX_COMMAND_PATTERN.sub("", text)
     return text
@@ -122,19 +150,11 @@ def recover_html_tokens(text: str) -> str:
     text = BARE_BR_PATTERN.sub("<br>", text)
 
     # details / summary タグ
-    for tag in BARE_TAGS:
-        text = re.sub(rf"(?<!<){tag}(?!>)", f"<{tag}>", text, flags=re.IGNORECASE)
+    for pattern, repl in BARE_TAG_FIXES:
+        text = pattern.sub(repl, text)
 
-    # img タグに紛れ込んだ <br> を外に出す
-    text = re.sub(r"<img([^>]*?)<br>[^>]*>", r"<img\1><br>", text, flags=re.IGNORECASE)
-    # img の閉じ > を保証
-    text = re.sub(r"(<img[^>\n]*)(?<!/)>?", r"\1>", text, flags=re.IGNORECASE)
-    # details/summary の閉じタグを修正
-    text = re.sub(r"\$\$\s*/details\s*\$\$", "</details>", text, flags=re.IGNORECASE)
-    text = re.sub(r"(?<!<)/details(?!>)", "</details>", text, flags=re.IGNORECASE)
-    text = re.sub(r"(?<!<)details(?!>)", "<details>", text, flags=re.IGNORECASE)
-    text = re.sub(r"(?<!<)/summary(?!>)", "</summary>", text, flags=re.IGNORECASE)
-    text = re.sub(r"<summary>([^<]*?)/<summary>", r"<summary>\1</summary>", text, flags=re.IGNORECASE)
+    for pattern, repl in HTML_TOKEN_FIXES:
+        text = pattern.sub(repl, text)
 
     return text
 
@@ -142,31 +162,25 @@ def recover_html_tokens(text: str) -> str:
 def finalize_html_tokens(text: str) -> str:
     """Fix remaining placeholders after full-line pass."""
 
-    replacements = {
-        r"\$\$\s*/details\s*\$\$": "</details>",
-        r"\$\$\s*details\s*\$\$": "<details>",
-        r"\$\$\s*/summary\s*\$\$": "</summary>",
-        r"\$\$\s*summary\s*\$\$": "<summary>",
-    }
-    for pattern, repl in replacements.items():
-        text = re.sub(pattern, repl, text, flags=re.IGNORECASE)
+    for pattern, repl in PLACEHOLDER_TAG_FIXES:
+        text = pattern.sub(repl, text)
     text = text.replace("<br>", "\n")
     return text
 
 
 def normalize_layout_marks(text: str) -> str:
-    text = re.sub(r"\s*<br>\s*", "\n", text)
-    text = re.sub(r"(<img[^>]+>)\s*\n+", r"\1\n", text)
-    text = PAGE_TAIL_PATTERN.sub(lambda m: f"（p.{m.group(1)}）", text)
-    text = BULLET_PATTERN.sub(lambda m: f"{m.group(1)}- ", text)
-    text = SECTION_ITEM_PATTERN.sub(lambda m: format_section_item(m), text)
-    text = re.sub(r"\n{3,}", "\n\n", text)
+    text = BR_SPACING_PATTERN.sub("\n", text)
+    text = IMG_TRAILING_NEWLINES_PATTERN.sub(r"\1\n", text)
+    text = PAGE_TAIL_PATTERN.sub(r"（p.\1）", text)
+    text = BULLET_PATTERN.sub(r"\1- ", text)
+    text = SECTION_ITEM_PATTERN.sub(format_section_item, text)
+    text = EXTRA_BLANK_LINES_PATTERN.sub("\n\n", text)
     return text
 
 
 def normalize_headings(text: str) -> str:
     stripped = text.strip()
-    match = re.match(r"^(#+)\s+\$(\d+(?:-\d+)+)\$\s*(.*)$", stripped)
+    match = NUMBERED_HEADING_PATTERN.match(stripped)
     if not match:
         return text
     level = min(6, max(1, len(match.group(2).split("-"))))
@@ -209,18 +223,27 @@ def demote_inner_headings_between_pages(text: str) -> str:
     return "\n".join(result)
 
 
-def clean_file(path: Path, inplace: bool = True) -> Path:
-    text = path.read_text(encoding="utf-8")
-    lines = text.splitlines()
+def clean_markdown(text: str) -> str:
+    """clean_file と同じ整形を文字列に対して行う（読み書きは呼び出し側に任せる）。"""
     cleaned_lines: list[str] = []
-    for line in lines:
+    for line in text.splitlines():
         cleaned = clean_text(line)
         if cleaned == "":
             continue
         cleaned_lines.append(cleaned)
     cleaned = "\n".join(cleaned_lines)
     cleaned = demote_inner_headings_between_pages(cleaned)
-    cleaned = finalize_html_tokens(cleaned)
+    return finalize_html_tokens(cleaned)
+
+
+def clean_file(path: Path, inplace: bool = True, max_passes: int = 1) -> Path:
+    """path を整形する。max_passes > 1 なら変化が無くなるまで（最大回数まで）メモリ上で繰り返し、書き込みは 1 回だけ行う。"""
+    cleaned = path.read_text(encoding="utf-8")
+    for _ in range(max(1, max_passes)):
+        previous = cleaned
+        cleaned = clean_markdown(previous)
+        if cleaned == previous:
+            break
     if inplace:
         path.write_text(cleaned, encoding="utf-8")
         return path
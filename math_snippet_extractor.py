@@ -18,13 +18,17 @@ poetry run python math_snippet_extractor.py --input result/sample --base-name sa
 from __future__ import annotations
 
 import argparse
+import functools
 import json
+import os
 import re
 from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
 from dataclasses import dataclass
 from pathlib import Path
-from typing import Iterable, Iterator, List, Sequence
+from typing import Any, Iterable, Iterator, List, Sequence
 
+import numpy as np
 from PIL import Image
 
 
@@ -57,14 +61,27 @@ MATH_TOKENS = (
 MATH_KEYWORDS = ("比率", "割合", "分数", "率", "比")
 
 URL_PATTERN = re.compile(r"https?://", re.IGNORECASE)
-BASE_PATTERN = re.compile(r"\([0-9]{1,3}\)\s*[0-9]{0,3}")  # (10), (12) 等
+# (10), (12) 等。後続の数字は任意なので search の真偽には影響せず、括弧部分だけを見る
+BASE_PATTERN = re.compile(r"\([0-9]{1,3}\)")
 SUB_SUP_PATTERN = re.compile(r"[_^][0-9]+")
 
+_DEDUP_GRID = 8
+
+# 演算子の個数は「削除して縮んだ文字数」で数える（C レベル 1 パス）
+_OPS_TABLE = str.maketrans("", "", "+-×÷=/%^·")
+
 JSON_PATTERN = re.compile(r"page(?:_images)?_page_(\d{3})")
 PAGE_HEADING_PATTERN = re.compile(r"^#\s+Page\s+(\d+)$")
 
+# Markdown 内のリンクは OS に依らず "/" 区切りで書く
+_FIG_PREFIX = "figures/"
+
+_NORM_TEXT_BRACE = re.compile(r"\\text\{([^}]*)\}")
+_NORM_STRIP = re.compile(r"[\$`~^\\{}_*\[\]()<>|]")
+_NORM_WS = re.compile(r"\s+")
+
 
-@dataclass
+@dataclass(slots=True, frozen=True)
 class MathRegion:
     page: int
     box: tuple[int, int, int, int]  # left, top, right, bottom
@@ -125,30 +142,43 @@ def parse_args() -> argparse.Namespace:
 
 
 def iter_json_files(json_dir: Path) -> Iterator[tuple[int, Path]]:
-    for path in sorted(json_dir.glob("*.json")):
-        match = JSON_PATTERN.search(path.stem)
-        if not match:
-            continue
-        page = int(match.group(1))
-        yield page, path
+    # scandir は stat を伴わないので glob より軽い。並びはページ番号（同番号はファイル名）で決める
+    entries: list[tuple[int, str, str]] = []
+    with os.scandir(json_dir) as it:
+        for entry in it:
+            if not entry.name.endswith(".json"):
+                continue
+            # ページ番号は接頭辞付きの stem 中に現れるため fullmatch ではなく search
+            match = JSON_PATTERN.search(entry.name)
+            if match:
+                entries.append((int(match.group(1)), entry.name, entry.path))
+    entries.sort()
+    for page, _, path in entries:
+        yield page, Path(path)
 
 
+@functools.lru_cache(maxsize=4096)
 def math_features(text: str) -> tuple[int, int, float, bool]:
     """Return (ops, digits, digit_ratio, has_base_marker)."""
-    ops = sum(text.count(ch) for ch in "+-×÷=/%^·")
-    digits = sum(ch.isdigit() for ch in text)
+    ops = len(text) - len(text.translate(_OPS_TABLE))
+    digits = sum(map(str.isdigit, text))
     length = max(1, len(text))
     digit_ratio = digits / length
-    has_base = bool(BASE_PATTERN.search(text) or SUB_SUP_PATTERN.search(text))
+    # どちらのパターンも数字を必須とするため、数字が無ければ正規表現を走らせない
+    has_base = digits > 0 and bool(BASE_PATTERN.search(text) or SUB_SUP_PATTERN.search(text))
     return ops, digits, digit_ratio, has_base
 
 
 def looks_math(text: str) -> bool:
+    return _looks_math_from_feats(text, math_features(text))
+
+
+def _looks_math_from_feats(text: str, feats: tuple[int, int, float, bool]) -> bool:
     if URL_PATTERN.search(text):
         return False
     if any(kw in text for kw in MATH_KEYWORDS):
         return True
-    ops, digits, digit_ratio, has_base = math_features(text)
+    ops, digits, digit_ratio, has_base = feats
     # 数字だけの行でも基数表記や下付きがあれば許容
     if has_base and digits >= 4:
         return True
@@ -160,65 +190,157 @@ def looks_math(text: str) -> bool:
     return False
 
 
+def _region_sort_key(region: MathRegion) -> tuple[float, int, int]:
+    """スコア降順 → 上から → 左から。"""
+    left, top, _, _ = region.box
+    return -region.score, top, left
+
+
 def load_regions(json_path: Path, *, min_score: float, min_ops: int, max_chars: int, max_aspect: float) -> List[MathRegion]:
     data = json.loads(json_path.read_text(encoding="utf-8"))
-    regions: List[MathRegion] = []
+    page = int(JSON_PATTERN.search(json_path.stem).group(1))
+
+    # 候補を一旦溜め、形状・スコア・文字数のしきい値判定は numpy でまとめて行う
+    boxes: list[Sequence[int]] = []
+    scores: list[float] = []
+    texts: list[str] = []
+    feats_list: list[tuple[int, int, float, bool]] = []
 
-    def add_region(page: int, box: Sequence[int], score: float, text: str) -> None:
+    def add_candidate(box: Sequence[int], score: float, text: str, feats: tuple[int, int, float, bool]) -> None:
         if len(box) != 4:
             return
-        left, top, right, bottom = box
-        # 位置が逆転している場合の簡易補正
-        if right < left:
-            left, right = right, left
-        if bottom < top:
-            top, bottom = bottom, top
-        width = max(1, right - left)
-        height = max(1, bottom - top)
-        aspect = max(width / height, height / width)
-        if aspect > max_aspect:
-            return
-        if len(text) > max_chars:
-            return
-        ops, digits, digit_ratio, has_base = math_features(text)
-        if ops < min_ops and not (has_base or digit_ratio >= 0.4):
-            return
-        if score < min_score:
-            return
-        regions.append(MathRegion(page=page, box=(left, top, right, bottom), score=score, text=text))
-
-    page = int(JSON_PATTERN.search(json_path.stem).group(1))
+        boxes.append(box)
+        scores.append(score)
+        texts.append(text)
+        feats_list.append(feats)
 
     for para in data.get("paragraphs", []):
         text = para.get("contents", "")
-        if looks_math(text):
+        feats = math_features(text)
+        if _looks_math_from_feats(text, feats):
             box = para.get("box")
             if box:
-                add_region(page, box, para.get("score", 0.5), text)
+                add_candidate(box, para.get("score", 0.5), text, feats)
 
     for det in data.get("detections", []):
         text = det.get("content", "")
-        if not looks_math(text):
+        feats = math_features(text)
+        if not _looks_math_from_feats(text, feats):
             continue
         points = det.get("points")
         if points and isinstance(points, list) and len(points) >= 4:
             xs = [p[0] for p in points]
             ys = [p[1] for p in points]
             box = [min(xs), min(ys), max(xs), max(ys)]
-            add_region(page, box, det.get("rec_score", det.get("det_score", 0.5)), text)
+            add_candidate(box, det.get("rec_score", det.get("det_score", 0.5)), text, feats)
+
+    if not boxes:
+        return []
+
+    arr = np.asarray(boxes, dtype=np.float64)
+    # 位置が逆転している場合の簡易補正（min/max で左上・右下に揃える）
+    width = np.maximum(1, np.abs(arr[:, 2] - arr[:, 0]))
+    height = np.maximum(1, np.abs(arr[:, 3] - arr[:, 1]))
+    aspect = np.maximum(width / height, height / width)
+    ops = np.fromiter((f[0] for f in feats_list), dtype=np.int64, count=len(feats_list))
+    digit_ratio = np.fromiter((f[2] for f in feats_list), dtype=np.float64, count=len(feats_list))
+    has_base = np.fromiter((f[3] for f in feats_list), dtype=bool, count=len(feats_list))
+    text_len = np.fromiter((len(t) for t in texts), dtype=np.int64, count=len(texts))
+    mask = (
+        (aspect <= max_aspect)
+        & (text_len <= max_chars)
+        & ((ops >= min_ops) | has_base | (digit_ratio >= 0.4))
+        & (np.asarray(scores, dtype=np.float64) >= min_score)
+    )
+
+    regions: List[MathRegion] = []
+    for i in np.flatnonzero(mask):
+        left, top, right, bottom = boxes[i]
+        box = (min(left, right), min(top, bottom), max(left, right), max(top, bottom))
+        regions.append(MathRegion(page=page, box=box, score=scores[i], text=texts[i]))
+
+    regions.sort(key=_region_sort_key)
+
+    # paragraphs と detections で同じ数式が重複しやすいので、8px グリッドに丸めた箱で重複を落とす
+    # （スコア降順に並べた後なので、残るのは最もスコアの高いもの）
+    seen: set[tuple[int, int, int, int]] = set()
+    unique: List[MathRegion] = []
+    for region in regions:
+        key = tuple(int(v) // _DEDUP_GRID for v in region.box)
+        if key in seen:
+            continue
+        seen.add(key)
+        unique.append(region)
+    return unique
+
+
+def _padded_box(box: tuple[int, int, int, int], width: int, height: int, padding: int) -> tuple[int, int, int, int]:
+    left, top, right, bottom = box
+    return (
+        max(0, left - padding),
+        max(0, top - padding),
+        min(width, right + padding),
+        min(height, bottom + padding),
+    )
+
+
+def crop_region(img: Image.Image, region: MathRegion, padding: int) -> Image.Image:
+    return img.crop(_padded_box(region.box, img.width, img.height, padding))
+
 
-    regions.sort(key=lambda r: (-r.score, r.box[1], r.box[0]))
-    return regions
+def _save_page_vips(
+    pyvips: Any,
+    page: int,
+    page_regions: Sequence[MathRegion],
+    img_path: Path,
+    figure_dir: Path,
+    padding: int,
+) -> list[tuple[str, str]]:
+    """libvips で必要な帯だけを逐次デコードして切り出す。"""
+    img = pyvips.Image.new_from_file(str(img_path), access="sequential")
+    boxes = [_padded_box(r.box, img.width, img.height, padding) for r in page_regions]
+    boxes = [(l, t, max(r, l + 1), max(b, t + 1)) for l, t, r, b in boxes]
+    # sequential 読み込みは後戻りできないため、最下端までの帯を一度だけメモリに載せてから切り出す
+    band_top = min(b[1] for b in boxes)
+    band_bottom = min(img.height, max(b[3] for b in boxes))
+    band = img.crop(0, band_top, img.width, band_bottom - band_top).copy_memory()
+    saved: list[tuple[str, str]] = []
+    for region, (left, top, right, bottom) in zip(page_regions, boxes):
+        name = f"eq_page{page:03}_{len(saved) + 1:02}.png"
+        snippet = band.crop(left, top - band_top, min(right, img.width) - left, min(bottom, band_bottom) - top)
+        snippet.pngsave(str(figure_dir / name), compression=1)
+        saved.append((name, region.text))
+    return saved
 
 
-def crop_region(img_path: Path, region: MathRegion, padding: int) -> Image.Image:
+def _save_page(
+    page: int,
+    page_regions: Sequence[MathRegion],
+    page_image_dir: Path,
+    figure_dir: Path,
+    padding: int,
+) -> list[tuple[str, str]]:
+    """1 ページ分の数式候補を切り出して保存する（プロセスプールから呼ぶためトップレベルに置く）。"""
+    img_path = page_image_dir / f"page_{page:03}.png"
+    if not img_path.exists() or not page_regions:
+        return []
+    try:
+        import pyvips  # type: ignore
+    except Exception:  # pyvips 未導入 / libvips が読めない場合は Pillow で処理する
+        pyvips = None
+    if pyvips is not None:
+        return _save_page_vips(pyvips, page, page_regions, img_path, figure_dir, padding)
+
+    saved: list[tuple[str, str]] = []
     with Image.open(img_path) as img:
-        left, top, right, bottom = region.box
-        left = max(0, left - padding)
-        top = max(0, top - padding)
-        right = min(img.width, right + padding)
-        bottom = min(img.height, bottom + padding)
-        return img.crop((left, top, right, bottom)).copy()
+        img.load()
+        for region in page_regions:
+            cropped = crop_region(img, region, padding)
+            name = f"eq_page{page:03}_{len(saved) + 1:02}.png"
+            # 中間生成物のスニペットなので圧縮率よりエンコード速度を優先する
+            cropped.save(figure_dir / name, format="PNG", compress_level=1, optimize=False)
+            saved.append((name, region.text))
+    return saved
 
 
 def save_regions(
@@ -229,110 +351,120 @@ def save_regions(
     max_per_page: int,
 ) -> dict[int, list[tuple[str, str]]]:
     figure_dir.mkdir(parents=True, exist_ok=True)
-    saved: dict[int, list[tuple[str, str]]] = defaultdict(list)
 
+    # ページ画像のデコードが支配的なので、ページ単位にまとめて 1 回だけ開く
+    by_page: dict[int, list[MathRegion]] = defaultdict(list)
     for region in regions:
-        if len(saved[region.page]) >= max_per_page:
-            continue
-        img_path = page_image_dir / f"page_{region.page:03}.png"
-        if not img_path.exists():
-            continue
-        cropped = crop_region(img_path, region, padding)
-        name = f"eq_page{region.page:03}_{len(saved[region.page]) + 1:02}.png"
-        out_path = figure_dir / name
-        cropped.save(out_path)
-        saved[region.page].append((name, region.text))
+        by_page[region.page].append(region)
+
+    # 上限はここで切っておき、ワーカーへ不要な候補を渡さない
+    args = [(page, rs[:max_per_page], page_image_dir, figure_dir, padding) for page, rs in by_page.items()]
+    if len(args) <= 2:
+        results = [_save_page(*a) for a in args]
+    else:
+        # ページごとに独立した decode→crop→encode なのでプロセス並列にする
+        with ProcessPoolExecutor(max_workers=os.cpu_count()) as pool:
+            results = list(pool.map(_save_page, *zip(*args)))
+
+    saved: dict[int, list[tuple[str, str]]] = {}
+    for (page, *_), page_saved in zip(args, results):
+        if page_saved:
+            saved[page] = page_saved
     return saved
 
 
+@functools.lru_cache(maxsize=8192)
+def normalize_for_match(text: str) -> str:
+    """照合用に記号・空白・大小文字差を落とす。見出しや空行など同じ行が繰り返し来るためキャッシュする。"""
+    t = _NORM_TEXT_BRACE.sub(r"\1", text.lower())
+    t = _NORM_STRIP.sub("", t)
+    return _NORM_WS.sub("", t)
+
+
+def _iter_body_lines(src: Iterable[str]) -> Iterator[str]:
+    """既存の数式スニペット行を除きながら 1 行ずつ返す。"""
+    for raw in src:
+        # Markdown / <img> いずれのスニペット参照も "eq_page" を含むので、正規表現は不要
+        if "eq_page" in raw:
+            continue
+        yield raw.rstrip("\n")
+
+
 def insert_links(
     merged_md: Path,
     output_md: Path,
     page_to_images: dict[int, list[tuple[str, str]]],
 ) -> None:
-    raw_lines = merged_md.read_text(encoding="utf-8").splitlines()
-    eq_md = re.compile(r"!\[[^\]]*\]\((?:\./)?figures/eq_page\d+_\d+\.png\)")
-    eq_html = re.compile(r"<img[^>]+eq_page\d+_\d+\.png[^>]*>", re.IGNORECASE)
-    lines = [ln for ln in raw_lines if not (eq_md.search(ln) or eq_html.search(ln) or "eq_page" in ln)]
-
-    def normalize_for_match(text: str) -> str:
-        t = text.lower()
-        t = re.sub(r"\\text\{([^}]*)\}", r"\1", t)
-        t = re.sub(r"[\$`~^\\{}_*\[\]()<>|]", "", t)
-        t = re.sub(r"\s+", "", t)
-        return t
-
-    output: list[str] = []
-    current_page: int | None = None
-    page_lines: list[str] = []
-
-    def flush_page() -> None:
-        nonlocal page_lines, current_page
-        if current_page is None:
-            return
-        pending = page_to_images.get(current_page, []).copy()
-        pending_norm = [(img, normalize_for_match(txt)) for img, txt in pending]
-
-        out_page: list[str] = []
-        for line in page_lines:
-            out_page.append(line)
-            norm_line = normalize_for_match(line)
-            if not norm_line:
-                continue
-            match_idx = None
-            for i, (_, txt_norm) in enumerate(pending_norm):
-                if txt_norm and txt_norm in norm_line:
-                    match_idx = i
+    # 文書全体をリストに溜めず、ページ単位でバッファして逐次書き出す
+    with merged_md.open(encoding="utf-8") as src, output_md.open("w", encoding="utf-8") as dst:
+        blank_run = 0
+
+        def emit(lines: Iterable[str]) -> None:
+            # 連続する空行を 2 行までに抑える（挿入時に空行を追加しているため）
+            nonlocal blank_run
+            for line in lines:
+                if line.strip() == "":
+                    blank_run += 1
+                else:
+                    blank_run = 0
+                if blank_run <= 2:
+                    dst.write(line + "\n")
+
+        current_page: int | None = None
+        page_lines: list[str] = []
+
+        def flush_page() -> None:
+            nonlocal page_lines
+            if current_page is None:
+                return
+            pending = page_to_images.get(current_page, []).copy()
+            # 照合は行ごとに全候補を走査するため、長さを先に持っておき明らかに入らない候補は部分一致検索を省く
+            pending_norm = [(len(norm), norm) for norm in (normalize_for_match(txt) for _, txt in pending)]
+
+            out_page: list[str] = []
+            for idx, line in enumerate(page_lines):
+                out_page.append(line)
+                if not pending_norm:
+                    # 候補を使い切ったら残りの行は照合せずそのまま出す
+                    out_page.extend(page_lines[idx + 1 :])
                     break
-            if match_idx is not None:
-                img_name = pending[match_idx][0]
-                out_page.extend([
-                    "",
-                    f'![eq]({Path("figures") / img_name})',
-                    "",
-                ])
-                pending.pop(match_idx)
-                pending_norm.pop(match_idx)
-
-        for img_name, _ in pending:
-            out_page.extend([
-                "",
-                f'![eq]({Path("figures") / img_name})',
-                "",
-            ])
-
-        output.extend(out_page)
-        page_lines = []
-
-    for line in lines:
-        stripped_line = line.strip()
-        heading_match = PAGE_HEADING_PATTERN.match(stripped_line)
-        if heading_match:
-            flush_page()
-            current_page = int(heading_match.group(1))
-            output.append(line)
-            continue
-
-        if current_page is None:
-            output.append(line)
-            continue
-
-        page_lines.append(line)
+                norm_line = normalize_for_match(line)
+                if not norm_line:
+                    continue
+                line_len = len(norm_line)
+                match_idx = None
+                for i, (txt_len, txt_norm) in enumerate(pending_norm):
+                    if 0 < txt_len <= line_len and txt_norm in norm_line:
+                        match_idx = i
+                        break
+                if match_idx is not None:
+                    img_name = pending[match_idx][0]
+                    out_page.extend(("", f"![eq]({_FIG_PREFIX}{img_name})", ""))
+                    pending.pop(match_idx)
+                    pending_norm.pop(match_idx)
+
+            for img_name, _ in pending:
+                out_page.extend(("", f"![eq]({_FIG_PREFIX}{img_name})", ""))
+
+            emit(out_page)
+            page_lines = []
+
+        for line in _iter_body_lines(src):
+            stripped_line = line.strip()
+            heading_match = PAGE_HEADING_PATTERN.match(stripped_line)
+            if heading_match:
+                flush_page()
+                current_page = int(heading_match.group(1))
+                emit((line,))
+                continue
 
-    flush_page()
+            if current_page is None:
+                emit((line,))
+                continue
 
-    # 連続する空行を 2 行までに抑える（挿入時に空行を追加しているため）
-    cleaned: list[str] = []
-    blank_run = 0
-    for line in output:
-        if line.strip() == "":
-            blank_run += 1
-        else:
-            blank_run = 0
-        if blank_run <= 2:
-            cleaned.append(line)
+            page_lines.append(line)
 
-    output_md.write_text("\n".join(cleaned) + "\n", encoding="utf-8")
+        flush_page()
 
 
 def main() -> None:
@@ -357,6 +489,8 @@ def main() -> None:
         raise SystemExit(f"ページ画像ディレクトリが見つかりません: {page_image_dir}")
 
     output_md = Path(args.output_md) if args.output_md else input_dir / f"{base_name}_merged_with_eq_img.md"
+    if output_md.resolve() == merged_md.resolve():
+        raise SystemExit(f"出力先が入力 Markdown と同じです（逐次書き出しのため上書きできません）: {output_md}")
 
     regions: list[MathRegion] = []
     for page, path in iter_json_files(json_dir):
@@ -11,35 +11,67 @@
 from __future__ import annotations
 
 import json
+import os
 import re
+import shutil
 import subprocess
 import sys
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass, replace, fields
+from functools import lru_cache
+from itertools import islice
 from pathlib import Path
-from typing import Iterable, Sequence, Dict, Any
+from typing import Callable, Iterable, NamedTuple, Sequence, Dict, Any
 
-from PIL import Image, ImageStat
+import numpy as np
+from PIL import Image, ImageEnhance
 
-from markdown_cleanup import clean_file
+from markdown_cleanup import clean_markdown
 
-RAW_MD_PATTERN = re.compile(r"page_(\d+)_p(\d+)\.md")
-ALT_MD_PATTERN = re.compile(r"(?:.*_)?page_?(\d+)(?:_p(\d+))?\.md")
 TARGET_MD_PATTERN = re.compile(r"page_(\d+)(?:_p(\d+))?\.md")
+# 正規化が必要な Markdown 名（YomiToku 出力の `<prefix>_page_N(_pM).md` などで、TARGET 形式ではないもの）を 1 本で判定する
+ANY_RAW_MD_PATTERN = re.compile(r"(?!page_\d+(?:_p\d+)?\.md$)(?:.*_)?page_?(\d+)(?:_p(\d+))?\.md")
 RAW_FIG_PATTERN = re.compile(r"(?:.*_)?page_(\d+)(?:_p(\d+))?_figure_(\d+)(\.[A-Za-z0-9]+)$")
 MATH_PATTERN = re.compile(r"(\\\(|\\\[)(.*?)(\\\)|\\\])", re.DOTALL)
 IMG_TAG_PATTERN = re.compile(
     r"<img[^>]*?src=\"(?P<src>[^\"]+)\"[^>]*?(?:alt=\"(?P<alt>[^\"]*)\")?[^>]*?>",
     re.IGNORECASE,
 )
+IMG_STRIP_PATTERN = re.compile(r"<img[^>]+>")
+# 数式本文内の不要なエスケープ。1 回の走査でまとめて置換する
+_MATH_SUBS = {
+    r"\-": "-",
+    r"\+": "+",
+    r"\×": r"\\times ",
+    r"\÷": r"\\div ",
+    r"\=": "=",
+}
+_MATH_ESCAPES_RE = re.compile("|".join(re.escape(k) for k in _MATH_SUBS))
+_MEANINGFUL_CHAR_RE = re.compile(r"[A-Za-z0-9\u3040-\u30ff\u4e00-\u9fff]")
+_FALLBACK_MIN_CHARS = 30
+# アイコン判定の対象にする図版の拡張子
+_IMG_EXTS = frozenset({".png", ".jpg", ".jpeg"})
+# 図版統計はこの長辺まで縮小してから取る
+_STATS_MAX_EDGE = 256
+
+
+class PageMetrics(NamedTuple):
+    """ページ画像の寸法。図版サイズの比率計算に使う。"""
+
+    width: int
+    height: int
+    area: int
 
 
 @dataclass
 class IconFilterConfig:
     policy: str = "auto"  # auto / review / keep
     log_candidates: bool = True
-    candidate_log_name: str = "icon_candidates.json"
+    candidate_log_name: str = "icon_candidates.jsonl"
     log_all_figures: bool = False
-    all_stats_log_name: str = "all_fig_stats.json"
+    all_stats_log_name: str = "all_fig_stats.jsonl"
     max_width: int = 1000
     max_height: int = 1000
     max_area: int = 1_000_000
@@ -60,7 +92,13 @@ class IconFilterConfig:
     max_color_samples: int = 4_096
 
 
+BATCH_STAGING_DIR_NAME = "_yomi_batch"
+
 _ICON_FILTER_CONFIG = IconFilterConfig()
+# 設定キーの検証用。fields() を呼び出しごとに辿らないよう読み込み時に 1 回だけ作る
+_ICON_CFG_KEYS = frozenset(f.name for f in fields(IconFilterConfig))
+# run_batch を並列実行したときにログ追記が混ざらないようにする
+_LOG_LOCK = threading.Lock()
 
 
 def update_icon_filter_config(**overrides: Any) -> IconFilterConfig:
@@ -70,10 +108,9 @@ def update_icon_filter_config(**overrides: Any) -> IconFilterConfig:
     if not overrides:
         return _ICON_FILTER_CONFIG
 
-    valid_keys = {f.name for f in fields(IconFilterConfig)}
     filtered: dict[str, Any] = {}
     for key, value in overrides.items():
-        if key not in valid_keys:
+        if key not in _ICON_CFG_KEYS:
             raise ValueError(f"未知の icon filter 設定キーです: {key}")
         filtered[key] = value
     _ICON_FILTER_CONFIG = replace(_ICON_FILTER_CONFIG, **filtered)
@@ -92,6 +129,8 @@ class OcrOptions:
     extra_args: Sequence[str] | None = None
     fallback_tesseract: bool = False
     force_tesseract_merge: bool = False
+    max_workers: int = 1  # run_batch で同時に処理するページ数
+    batch_size: int = 1  # run_batch で 1 回の YomiToku 起動にまとめるページ数（1 ならページごとに起動）
 
     def to_cli_args(self) -> list[str]:
         args: list[str] = []
@@ -154,6 +193,11 @@ def build_json_command(image_path: Path, output_dir: Path, options: OcrOptions)
 
 def _img_tag_to_markdown(text: str) -> str:
     """Convert HTML <img> tags to markdown image syntax ![alt](src)."""
+    # タグが無いページでは正規表現を走らせない（IGNORECASE なので大文字小文字混在も最後に確認）
+    if "<" not in text:
+        return text
+    if "<img" not in text and "<IMG" not in text and "<img" not in text.lower():
+        return text
 
     def repl(match: re.Match) -> str:
         src = match.group("src")
@@ -163,151 +207,187 @@ def _img_tag_to_markdown(text: str) -> str:
     return IMG_TAG_PATTERN.sub(repl, text)
 
 
-def normalize_markdown_files(output_dir: Path, target_page: int | None = None) -> None:
-    for md_path in output_dir.glob("*.md"):
-        name = md_path.name
-        if TARGET_MD_PATTERN.fullmatch(name):
-            continue
-        match = RAW_MD_PATTERN.fullmatch(name)
-        if not match:
-            match = ALT_MD_PATTERN.fullmatch(name)
-        if not match:
-            continue
-
-        page_num = int(match.group(1))
-        part = int(match.group(2) or "1")
-
-        if target_page is not None and page_num != target_page:
-            continue
+def normalize_markdown_files(output_dir: Path, target_page: int | None = None) -> list[Path]:
+    """YomiToku 出力の md を `page_NNN[_pNN].md` に改名する。
 
-        suffix = "" if part <= 1 else f"_p{part:02}"
-        new_path = output_dir / f"page_{page_num:03}{suffix}.md"
-        if new_path.exists():
-            new_path.unlink()
-        md_path.rename(new_path)
+    target_page 指定時は、正規化後のそのページの md 一覧（list_page_markdown と同じ集合）を返し、
+    呼び出し側がディレクトリを走査し直さずに済むようにする。
+    """
+    # 対象ページ指定時は、ページ番号（先頭ゼロなし）の数字列を含まない名前を正規表現の前に落とす。
+    # 一致した番号が int で target_page と等しければ、その数字列は必ず名前に含まれる
+    # （`page_NNN` もゼロ埋めした番号なので同じく含む）
+    needle = str(target_page) if target_page is not None else ""
+    prefix = f"page_{target_page:03}" if target_page is not None else None
+    with os.scandir(output_dir) as it:
+        entries = [entry for entry in it if entry.name.endswith(".md") and needle in entry.name]
+    page_files: set[str] = set()
+    for entry in entries:
+        match = ANY_RAW_MD_PATTERN.fullmatch(entry.name)
+        if match:
+            page_num = int(match.group(1))
+            if target_page is None or page_num == target_page:
+                part = int(match.group(2) or "1")
+                suffix = "" if part <= 1 else f"_p{part:02}"
+                new_name = f"page_{page_num:03}{suffix}.md"
+                # os.replace は既存ファイルがあっても 1 回で上書きできる（Windows でも可）
+                os.replace(entry.path, output_dir / new_name)
+                page_files.add(new_name)
+                continue
+        if prefix is not None and entry.name.startswith(prefix) and entry.is_file():
+            page_files.add(entry.name)
+    return [output_dir / name for name in page_files]
 
 
 def rename_figure_assets(
     output_dir: Path,
     page_number: int,
     icon_config: IconFilterConfig | None = None,
-    page_metrics: dict[str, Any] | None = None,
+    page_metrics: PageMetrics | None = None,
+    *,
+    md_files: list[Path] | None = None,
 ) -> None:
     figure_dir = output_dir / "figures"
     if not figure_dir.exists():
         return
 
-    # 既存の正規化済みファイル（fig_page...）が残っていると Windows では rename が失敗するため、
-    # 対象ページ分だけ先に削除して上書きできるようにする。
-    for stale in figure_dir.glob(f"fig_page{page_number:03d}_*"):
+    # DirEntry の name / path は str のまま取れるので、Path を作らずに照合・リネームする。
+    # 既存の正規化済みファイル（fig_page...）も同じ 1 回の走査で拾う
+    stale_prefix = f"fig_page{page_number:03d}_"
+    stale: Dict[str, str] = {}
+    entries = []
+    with os.scandir(figure_dir) as it:
+        for entry in it:
+            if entry.name.startswith(stale_prefix):
+                stale[entry.name] = entry.path
+                continue
+            match = RAW_FIG_PATTERN.match(entry.name)
+            if not match:
+                continue
+            page = int(match.group(1))
+            if page != page_number:
+                continue
+            part = int(match.group(2) or 0)
+            idx = int(match.group(3))
+            entries.append((part, idx, entry.name, entry.path, match.group(4).lower()))
+
+    entries.sort()
+    renames = [
+        (old_name, old_path, f"fig_page{page_number:03d}_{new_idx:02d}{suffix}")
+        for new_idx, (_, _, old_name, old_path, suffix) in enumerate(entries, start=1)
+    ]
+
+    # 今回の図版で上書きされない古い fig_page... だけを消す（上書き分は os.replace が 1 回で置き換える。
+    # os.replace は Windows でも既存ファイルを上書きできる）
+    for _, _, new_name in renames:
+        stale.pop(new_name, None)
+    for stale_path in stale.values():
         try:
-            stale.unlink()
+            os.unlink(stale_path)
         except FileNotFoundError:
             pass
 
-    entries = []
-    for fig_path in figure_dir.glob("*"):
-        match = RAW_FIG_PATTERN.match(fig_path.name)
-        if not match:
-            continue
-        page = int(match.group(1))
-        if page != page_number:
-            continue
-        part = int(match.group(2) or 0)
-        idx = int(match.group(3))
-        entries.append((part, idx, fig_path))
-
-    if not entries:
+    if not renames:
         return
 
-    entries.sort()
+    figure_dir_str = os.fspath(figure_dir)
     mapping: Dict[str, str] = {}
-    for new_idx, (_, _, fig_path) in enumerate(entries, start=1):
-        old_name = fig_path.name
-        new_name = f"fig_page{page_number:03d}_{new_idx:02d}{fig_path.suffix.lower()}"
-        new_path = figure_dir / new_name
-        if new_path.exists():
-            try:
-                new_path.unlink()
-            except FileNotFoundError:
-                pass
-        fig_path.rename(new_path)
+    for old_name, old_path, new_name in renames:
+        os.replace(old_path, os.path.join(figure_dir_str, new_name))
         mapping[old_name] = new_name
 
-    _update_markdown_figure_links(output_dir, page_number, mapping)
-    remove_icon_figures(output_dir, page_number, icon_config, page_metrics)
+    # 以降の処理はすべて同じページ Markdown を対象にするので、一覧は 1 回だけ取る
+    if md_files is None:
+        md_files = list_page_markdown(output_dir, page_number)
+    _update_markdown_figure_links(output_dir, page_number, mapping, md_files=md_files)
+    remove_icon_figures(output_dir, page_number, icon_config, page_metrics, md_files=md_files)
+
+
+def _iter_page_figures(figure_dir: Path, page_number: int) -> list[os.DirEntry[str]]:
+    """`fig_pageNNN_*` を 1 回の scandir と前方一致だけで列挙する（glob の fnmatch を避ける）。"""
+    prefix = f"fig_page{page_number:03d}_"
+    with os.scandir(figure_dir) as it:
+        return [entry for entry in it if entry.name.startswith(prefix)]
 
 
-def _update_markdown_figure_links(output_dir: Path, page_number: int, mapping: Dict[str, str]) -> None:
+def list_page_markdown(output_dir: Path, page_number: int) -> list[Path]:
+    """`page_NNN*.md` を 1 回の scandir で列挙する（glob と同じ前方一致）。"""
+    prefix = f"page_{page_number:03}"
+    with os.scandir(output_dir) as it:
+        return [
+            Path(entry.path)
+            for entry in it
+            if entry.name.startswith(prefix) and entry.name.endswith(".md") and entry.is_file()
+        ]
+
+
+def _update_markdown_figure_links(
+    output_dir: Path,
+    page_number: int,
+    mapping: Dict[str, str],
+    *,
+    md_files: list[Path] | None = None,
+) -> None:
     if not mapping:
         return
 
-    candidates = list(output_dir.glob(f"page_{page_number:03}*.md"))
-    for md_path in candidates:
-        text = md_path.read_text(encoding="utf-8")
-        replaced = False
-        for old, new in mapping.items():
-            new_path = f"./figures/{new}"
-            replacements = [
-                (f'src="figures/{old}"', f'src="{new_path}"'),
-                (f'src="./figures/{old}"', f'src="{new_path}"'),
-                (f'src="{old}"', f'src="{new_path}"'),
-                (f'](figures/{old})', f']({new_path})'),
-                (f'](./figures/{old})', f']({new_path})'),
-                (f']({old})', f']({new_path})'),
-            ]
-            for old_token, new_token in replacements:
-                if old_token in text:
-                    text = text.replace(old_token, new_token)
-                    replaced = True
-            # フォールバック（素のパスだけが残っているケース）
-            raw_variants = [f"figures/{old}", f"./figures/{old}", old]
-            for variant in raw_variants:
-                if variant in text:
-                    text = text.replace(variant, new_path)
-                    replaced = True
+    link_pattern = _fig_link_regex(tuple(sorted(mapping)))
+
+    def link_repl(match: re.Match[str]) -> str:
+        return f"./figures/{mapping[match.group(1)]}"
+
+    if md_files is None:
+        md_files = list_page_markdown(output_dir, page_number)
+    for md_path in md_files:
+        # リンク置換・<img> 変換・数式整形・クリーンアップをすべてメモリ上で済ませ、
+        # 1 ファイルにつき読み込み 1 回、書き込みは内容が変わったときの 1 回だけにする
+        original = md_path.read_text(encoding="utf-8")
+        # 先頭が任意のグループで始まるパターンは全位置で候補を試すため、旧名を含まないファイルでは走らせない
+        text = original
+        if any(name in original for name in mapping):
+            text = link_pattern.sub(link_repl, original)
         text = _img_tag_to_markdown(text)
-        sanitized = _sanitize_math(text)
-        if sanitized != text:
-            text = sanitized
-            replaced = True
-        if replaced:
+        text = _sanitize_math(text)
+        text = clean_markdown(text)
+        if text != original:
             md_path.write_text(text, encoding="utf-8")
 
-    cleanup_markdown_files(output_dir, page_number)
-
-
-def cleanup_markdown_files(output_dir: Path, page_number: int) -> None:
-    for md_path in output_dir.glob(f"page_{page_number:03}*.md"):
-        clean_file(md_path, inplace=True)
-
 
 def remove_icon_figures(
     output_dir: Path,
     page_number: int,
     config: IconFilterConfig | None = None,
-    page_metrics: dict[str, Any] | None = None,
+    page_metrics: PageMetrics | None = None,
+    *,
+    md_files: list[Path] | None = None,
 ) -> None:
     figure_dir = output_dir / "figures"
     if not figure_dir.exists():
         return
 
     config = config or get_icon_filter_config()
-    removable: list[tuple[Path, dict[str, Any], str]] = []
+    # keep ポリシーで何もログしないなら、統計を取っても結果が使われないので画像を開かない
+    if config.policy == "keep" and not config.log_candidates and not config.log_all_figures:
+        return
+    removable: list[tuple[str, dict[str, Any], str]] = []
     log_records: list[dict[str, Any]] = []
     all_records: list[dict[str, Any]] = []
-    for fig_path in figure_dir.glob(f"fig_page{page_number:03d}_*"):
-        if fig_path.suffix.lower() not in {".png", ".jpg", ".jpeg"}:
+    for entry in _iter_page_figures(figure_dir, page_number):
+        name = entry.name
+        if os.path.splitext(name)[1].lower() not in _IMG_EXTS:
             continue
         try:
-            with Image.open(fig_path) as img:
+            with Image.open(entry.path) as img:
+                # サイズはヘッダだけで分かるので、明らかに大きい図版はデコードせずに残す
+                # （全図版ログを取る場合は統計が必要なので従来どおり計算する）
+                if not config.log_all_figures and _size_rejects_icon(*img.size, page_metrics, config):
+                    continue
                 stats = collect_figure_stats(img, config, page_metrics)
         except Exception:
             continue
         decision = decide_icon_action(stats, config)
         record = {
             "page": page_number,
-            "figure": fig_path.name,
+            "figure": name,
             "decision": decision,
             "removed": should_remove_icon(decision, config),
             "metrics": stats,
@@ -316,7 +396,7 @@ def remove_icon_figures(
         if config.log_candidates and decision != "keep":
             log_records.append(record)
         if should_remove_icon(decision, config):
-            removable.append((fig_path, stats, decision))
+            removable.append((entry.path, stats, decision))
 
     if config.log_all_figures and all_records:
         _append_all_stats_log(figure_dir, all_records, config)
@@ -326,10 +406,13 @@ def remove_icon_figures(
     if not removable:
         return
 
+    # 参照の除去は全アイコン分をまとめて 1 回で行う
+    remove_figure_references(
+        output_dir, page_number, [os.path.basename(icon) for icon, _, _ in removable], md_files=md_files
+    )
     for icon, _, _ in removable:
-        remove_figure_references(output_dir, page_number, icon.name)
         try:
-            icon.unlink()
+            os.unlink(icon)
         except FileNotFoundError:
             pass
 
@@ -337,39 +420,46 @@ def remove_icon_figures(
 def collect_figure_stats(
     image: Image.Image,
     config: IconFilterConfig,
-    page_metrics: dict[str, Any] | None = None,
+    page_metrics: PageMetrics | None = None,
 ) -> dict[str, Any]:
     width, height = image.size
     area = width * height
     aspect_ratio = (width / height) if height else 0
-    sample = image.convert("RGB")
-    colors = sample.getcolors(maxcolors=config.max_color_samples) or []
-    unique = len(colors)
-
-    stat_rgb = ImageStat.Stat(sample)
-    avg_std = sum(stat_rgb.stddev) / max(1, len(stat_rgb.stddev))
-
-    gray = image.convert("L")
-    stat_gray = ImageStat.Stat(gray)
-    mean_luma = stat_gray.mean[0]
-    histogram = gray.histogram()
-    white_pixels = sum(histogram[250:])
-    non_white_ratio = 0.0
-    if area:
-        non_white_ratio = max(0.0, min(1.0, (area - white_pixels) / area))
-
+    # 大きな図版は統計用に縮小する。補間で中間色が増えると色数しきい値が狂うため NEAREST を使う
+    # （thumbnail はその場で縮小するので、その場合だけ convert のコピーを作る）
+    if max(width, height) > _STATS_MAX_EDGE:
+        sample = image.convert("RGB")
+        sample.thumbnail((_STATS_MAX_EDGE, _STATS_MAX_EDGE), Image.NEAREST)
+    else:
+        # 既に RGB の小さな図版は convert のコピーを作らず、そのまま配列として読む
+        sample = image if image.mode == "RGB" else image.convert("RGB")
+    rgb = np.asarray(sample, dtype=np.uint8).reshape(-1, 3)
+    pixels = rgb.shape[0]
+    # 色のパックと輝度計算の両方で使うので、uint32 への拡張は 1 回だけ行う
+    wide = rgb.astype(np.uint32)
+    r, g, b = wide[:, 0], wide[:, 1], wide[:, 2]
+
+    unique = 0
     dominant_ratio = 0.0
-    if colors and area:
-        dominant = max(count for count, _ in colors)
-        dominant_ratio = dominant / area
-
-    page_width = page_metrics.get("width") if page_metrics else None
-    page_height = page_metrics.get("height") if page_metrics else None
-    page_area = page_metrics.get("area") if page_metrics else None
+    avg_std = 0.0
+    if pixels:
+        packed = (r << 16) | (g << 8) | b
+        _, counts = np.unique(packed, return_counts=True)
+        # getcolors(maxcolors=...) と同じく、上限を超える色数は「数えられない」(0) 扱いにする
+        if counts.size <= config.max_color_samples:
+            unique = int(counts.size)
+            dominant_ratio = float(counts.max()) / pixels
+        avg_std = float(rgb.std(axis=0).mean())
+
+    # convert("L") をもう一度走らせず、同じ RGB 配列から Pillow と同一の固定小数点 ITU-R 601 で輝度を出す
+    gray = (r * 19595 + g * 38470 + b * 7471 + 0x8000) >> 16
+    mean_luma = float(gray.mean()) if pixels else 0.0
+    white_pixels = int(np.count_nonzero(gray >= 250))
+    non_white_ratio = 0.0
+    if pixels:
+        non_white_ratio = max(0.0, min(1.0, (pixels - white_pixels) / pixels))
 
-    width_ratio = (width / page_width) if page_width else 0.0
-    height_ratio = (height / page_height) if page_height else 0.0
-    area_ratio = (area / page_area) if page_area else 0.0
+    width_ratio, height_ratio, area_ratio = _page_ratios(width, height, page_metrics)
 
     return {
         "width": width,
@@ -387,23 +477,66 @@ def collect_figure_stats(
     }
 
 
-def decide_icon_action(stats: dict[str, Any], config: IconFilterConfig) -> str:
-    area = stats["area"]
-    width = stats["width"]
-    height = stats["height"]
-    width_ratio = stats["width_ratio"]
-    height_ratio = stats["height_ratio"]
-    area_ratio = stats["area_ratio"]
+def _page_ratios(width: int, height: int, page_metrics: PageMetrics | None) -> tuple[float, float, float]:
+    page_width, page_height, page_area = page_metrics if page_metrics is not None else (0, 0, 0)
 
-    if area == 0:
-        return "keep"
-    if (
-        width > config.max_width
+    width_ratio = (width / page_width) if page_width else 0.0
+    height_ratio = (height / page_height) if page_height else 0.0
+    area_ratio = (width * height / page_area) if page_area else 0.0
+    return width_ratio, height_ratio, area_ratio
+
+
+def _exceeds_icon_size(
+    width: int,
+    height: int,
+    area: int,
+    width_ratio: float,
+    height_ratio: float,
+    area_ratio: float,
+    config: IconFilterConfig,
+) -> bool:
+    return (
+        area == 0
+        or width > config.max_width
         or height > config.max_height
         or area > config.max_area
         or width_ratio > config.max_width_ratio
         or height_ratio > config.max_height_ratio
         or area_ratio > config.max_area_ratio
+    )
+
+
+def _size_rejects_icon(
+    width: int,
+    height: int,
+    page_metrics: PageMetrics | None,
+    config: IconFilterConfig,
+) -> bool:
+    """画素を読まずにサイズだけで「アイコンではない(keep)」と確定できるか。"""
+    width_ratio, height_ratio, area_ratio = _page_ratios(width, height, page_metrics)
+    return _exceeds_icon_size(
+        width,
+        height,
+        width * height,
+        round(width_ratio, 6),
+        round(height_ratio, 6),
+        round(area_ratio, 6),
+        config,
+    )
+
+
+def decide_icon_action(stats: dict[str, Any], config: IconFilterConfig) -> str:
+    area = stats["area"]
+    area_ratio = stats["area_ratio"]
+
+    if _exceeds_icon_size(
+        stats["width"],
+        stats["height"],
+        area,
+        stats["width_ratio"],
+        stats["height_ratio"],
+        area_ratio,
+        config,
     ):
         return "keep"
 
@@ -445,41 +578,46 @@ def should_remove_icon(decision: str, config: IconFilterConfig) -> bool:
     return False
 
 
+def _append_jsonl(log_path: Path, records: list[dict[str, Any]]) -> None:
+    # 追記のみの JSON Lines にして、ページごとにログ全体を読み直し・書き直ししない
+    lines = [json.dumps(record, ensure_ascii=False) + "\n" for record in records]
+    with _LOG_LOCK, log_path.open("a", encoding="utf-8") as fp:
+        fp.writelines(lines)
+
+
 def _append_icon_log(figure_dir: Path, records: list[dict[str, Any]], config: IconFilterConfig) -> None:
-    log_path = figure_dir / config.candidate_log_name
-    existing: list[dict[str, Any]] = []
-    if log_path.exists():
-        try:
-            existing = json.loads(log_path.read_text(encoding="utf-8"))
-            if not isinstance(existing, list):
-                existing = []
-        except json.JSONDecodeError:
-            existing = []
-    existing.extend(records)
-    log_path.write_text(json.dumps(existing, ensure_ascii=False, indent=2), encoding="utf-8")
+    _append_jsonl(figure_dir / config.candidate_log_name, records)
 
 
 def _append_all_stats_log(figure_dir: Path, records: list[dict[str, Any]], config: IconFilterConfig) -> None:
-    log_path = figure_dir / config.all_stats_log_name
-    existing: list[dict[str, Any]] = []
-    if log_path.exists():
-        try:
-            existing = json.loads(log_path.read_text(encoding="utf-8"))
-            if not isinstance(existing, list):
-                existing = []
-        except json.JSONDecodeError:
-            existing = []
-    existing.extend(records)
-    log_path.write_text(json.dumps(existing, ensure_ascii=False, indent=2), encoding="utf-8")
+    _append_jsonl(figure_dir / config.all_stats_log_name, records)
 
 
-def _load_page_metrics(image_path: Path) -> dict[str, Any] | None:
+def _load_page_metrics(image_path: Path) -> PageMetrics | None:
     try:
         with Image.open(image_path) as img:
             width, height = img.size
     except Exception:
         return None
-    return {"width": width, "height": height, "area": width * height}
+    return PageMetrics(width, height, width * height)
+
+
+def _prepare_tesseract_image(image_path: Path) -> Image.Image:
+    stat = image_path.stat()
+    return _prepare_tesseract_image_cached(str(image_path), stat.st_mtime_ns)
+
+
+@lru_cache(maxsize=2)
+def _prepare_tesseract_image_cached(path_str: str, mtime_ns: int) -> Image.Image:
+    """グレースケール化してコントラストを少し上げた画像。fallback と force merge で同じページを共有する。"""
+    with Image.open(path_str) as im:
+        gray = im.convert("L")
+    return ImageEnhance.Contrast(gray).enhance(1.6)
+
+
+def _write_fallback_log(output_dir: Path, page_number: int, text: str) -> None:
+    # ページごとに分けて、並列実行時に他ページのフォールバック記録を上書きしないようにする
+    (output_dir / f"fallback_page_{page_number:03d}.log").write_text(text, encoding="utf-8")
 
 
 def _maybe_fallback_tesseract(image_path: Path, output_dir: Path, page_number: int) -> None:
@@ -490,43 +628,35 @@ def _maybe_fallback_tesseract(image_path: Path, output_dir: Path, page_number: i
         return
 
     text = md_path.read_text(encoding="utf-8")
-    stripped = re.sub(r"<img[^>]+>", "", text)
+    stripped = IMG_STRIP_PATTERN.sub("", text)
     stripped = stripped.replace("\\g<1>", "").strip()
-    meaningful = re.findall(r"[A-Za-z0-9\u3040-\u30ff\u4e00-\u9fff]", stripped)
-    if len(meaningful) >= 30:
+    # しきい値に届いた時点で走査を打ち切る
+    meaningful = sum(1 for _ in islice(_MEANINGFUL_CHAR_RE.finditer(stripped), _FALLBACK_MIN_CHARS))
+    if meaningful >= _FALLBACK_MIN_CHARS:
         return  # それなりに文字があると判断
 
     log_lines: list[str] = []
     try:
         import pytesseract  # type: ignore
-        from PIL import Image, ImageEnhance
     except Exception as exc:  # pragma: no cover
-        (output_dir / "fallback.log").write_text(
-            f"pytesseract unavailable: {exc}\n", encoding="utf-8"
-        )
+        _write_fallback_log(output_dir, page_number, f"pytesseract unavailable: {exc}\n")
         return
 
     try:
-        with Image.open(image_path) as im:
-            gray = im.convert("L")
-            # コントラストを少し上げてから認識
-            gray = ImageEnhance.Contrast(gray).enhance(1.6)
-            text = pytesseract.image_to_string(
-                gray,
-                lang="jpn+eng",
-                config="--psm 6",
-            )
-            log_lines.append("fallback=tesseract applied (contrast x1.6)")
-    except Exception as exc:  # pragma: no cover
-        (output_dir / "fallback.log").write_text(
-            f"pytesseract failed: {exc}\n", encoding="utf-8"
+        text = pytesseract.image_to_string(
+            _prepare_tesseract_image(image_path),
+            lang="jpn+eng",
+            config="--psm 6",
         )
+        log_lines.append("fallback=tesseract applied (contrast x1.6)")
+    except Exception as exc:  # pragma: no cover
+        _write_fallback_log(output_dir, page_number, f"pytesseract failed: {exc}\n")
         return
 
     if text.strip():
         md_path.write_text(text.strip(), encoding="utf-8")
         log_lines.append(f"chars: {len(text.strip())}")
-        (output_dir / "fallback.log").write_text("\n".join(log_lines), encoding="utf-8")
+        _write_fallback_log(output_dir, page_number, "\n".join(log_lines))
 
 
 def _force_tesseract_merge(image_path: Path, output_dir: Path, page_number: int) -> None:
@@ -538,26 +668,18 @@ def _force_tesseract_merge(image_path: Path, output_dir: Path, page_number: int)
 
     try:
         import pytesseract  # type: ignore
-        from PIL import Image, ImageEnhance
     except Exception as exc:  # pragma: no cover
-        (output_dir / "fallback.log").write_text(
-            f"force_tesseract_merge unavailable: {exc}\n", encoding="utf-8"
-        )
+        _write_fallback_log(output_dir, page_number, f"force_tesseract_merge unavailable: {exc}\n")
         return
 
     try:
-        with Image.open(image_path) as im:
-            gray = im.convert("L")
-            gray = ImageEnhance.Contrast(gray).enhance(1.6)
-            text = pytesseract.image_to_string(
-                gray,
-                lang="jpn+eng",
-                config="--psm 6",
-            )
-    except Exception as exc:  # pragma: no cover
-        (output_dir / "fallback.log").write_text(
-            f"force_tesseract_merge failed: {exc}\n", encoding="utf-8"
+        text = pytesseract.image_to_string(
+            _prepare_tesseract_image(image_path),
+            lang="jpn+eng",
+            config="--psm 6",
         )
+    except Exception as exc:  # pragma: no cover
+        _write_fallback_log(output_dir, page_number, f"force_tesseract_merge failed: {exc}\n")
         return
 
     if not text.strip():
@@ -566,71 +688,192 @@ def _force_tesseract_merge(image_path: Path, output_dir: Path, page_number: int)
     existing = md_path.read_text(encoding="utf-8")
     merged = existing.rstrip() + "\n\n<!-- tesseract -->\n" + text.strip()
     md_path.write_text(merged, encoding="utf-8")
-    (output_dir / "fallback.log").write_text(
-        "force_tesseract_merge appended\n", encoding="utf-8"
-    )
+    _write_fallback_log(output_dir, page_number, "force_tesseract_merge appended\n")
+
 
+@lru_cache(maxsize=512)
+def _fig_link_regex(old_names: tuple[str, ...]) -> re.Pattern[str]:
+    # src="figures/x" / ](./figures/x) / 素のパスなど、どの書き方も「(./)(figures/)旧名」を新パスへ置き換えるだけなので、
+    # 1 本の正規表現にまとめて 1 回の走査で済ませる（長い名前を先に並べて部分一致を防ぐ）
+    names = sorted(old_names, key=len, reverse=True)
+    return re.compile(r"(?:\./)?(?:figures/)?(" + "|".join(re.escape(name) for name in names) + ")")
 
-def remove_figure_references(output_dir: Path, page_number: int, figure_name: str) -> None:
-    candidates = list(output_dir.glob(f"page_{page_number:03}*.md"))
+
+@lru_cache(maxsize=512)
+def _fig_ref_regex(figure_names: tuple[str, ...]) -> re.Pattern[bytes]:
+    names = "|".join(re.escape(name) for name in figure_names)
     patterns = [
-        rf"!\[[^\]]*\]\((?:\./)?figures/{re.escape(figure_name)}\)",
-        rf"<img[^>]+src=\"(?:\./)?figures/{re.escape(figure_name)}\"[^>]*>"
+        rf"!\[[^\]]*\]\((?:\./)?figures/(?:{names})\)",
+        rf"<img[^>]+src=\"(?:\./)?figures/(?:{names})\"[^>]*>"
     ]
-    combined = re.compile("|".join(patterns))
-    for md_path in candidates:
-        text = md_path.read_text(encoding="utf-8")
-        new_text = combined.sub("", text)
-        if new_text != text:
-            md_path.write_text(new_text, encoding="utf-8")
+    # 区切り文字はすべて ASCII で、UTF-8 の多バイト文字に ASCII バイトは現れないため、バイト列のまま照合できる
+    return re.compile("|".join(patterns).encode("utf-8"))
+
+
+def remove_figure_references(
+    output_dir: Path,
+    page_number: int,
+    figure_names: str | Iterable[str],
+    *,
+    md_files: list[Path] | None = None,
+) -> None:
+    if isinstance(figure_names, str):
+        figure_names = (figure_names,)
+    # 順序や重複が違っても同じコンパイル済みパターンを引けるよう、キャッシュキーを正規化する
+    names = tuple(sorted(set(figure_names)))
+    if not names:
+        return
+    combined = _fig_ref_regex(names)
+    encoded_names = [name.encode("utf-8") for name in names]
+    if md_files is None:
+        md_files = list_page_markdown(output_dir, page_number)
+    for md_path in md_files:
+        # 参照の削除だけなので、デコード/エンコードを挟まずバイト列で読み書きする
+        data = md_path.read_bytes()
+        # 対象の図版名を含まないファイルは正規表現を走らせない
+        if not any(name in data for name in encoded_names):
+            continue
+        new_data = combined.sub(b"", data)
+        if new_data is not data:
+            md_path.write_bytes(new_data)
+
+
+def _math_escape_repl(match: re.Match[str]) -> str:
+    return _MATH_SUBS[match.group(0)]
+
+
+def _math_block_repl(match: re.Match[str]) -> str:
+    opener, body, _ = match.groups()
+    # 5 種のエスケープはどれもバックスラッシュ始まりなので、無ければ置換パスを省く
+    if "\\" in body:
+        body = _MATH_ESCAPES_RE.sub(_math_escape_repl, body)
+    delimiter = "$$" if opener == r"\[" else "$"
+    return f"{delimiter}{body}{delimiter}"
 
 
 def _sanitize_math(text: str) -> str:
-    def repl(match: re.Match[str]) -> str:
-        opener, body, closer = match.groups()
-        body = body.replace(r"\-", "-")
-        body = body.replace(r"\+", "+")
-        body = body.replace(r"\×", r"\\times ")
-        body = body.replace(r"\÷", r"\\div ")
-        body = body.replace(r"\=", "=")
-        new_opener = "$$" if opener == r"\[" else "$"
-        new_closer = new_opener
-        return f"{new_opener}{body}{new_closer}"
+    # 開き括弧が無ければ DOTALL の MATH_PATTERN は必ず不一致なので走査しない
+    if "\\(" not in text and "\\[" not in text:
+        return text
+    return MATH_PATTERN.sub(_math_block_repl, text)
 
-    return MATH_PATTERN.sub(repl, text)
 
+_LOG_TAIL_BYTES = 4_000
 
-def run_ocr(
+
+def _read_log_tail(fp) -> str:
+    fp.seek(max(0, fp.seek(0, os.SEEK_END) - _LOG_TAIL_BYTES))
+    return fp.read().decode("utf-8", errors="replace").strip()
+
+
+def _run_logged(cmd: list[str], log_path: Path, label: str, *, append: bool = False) -> None:
+    """コマンドの stdout/stderr をログファイルへ直接流す（Python 側で全出力を文字列化しない）。
+
+    append=True のログは複数ページで共有されるため、いったん一時ファイルへ流してから
+    _LOG_LOCK の下でまとめて追記する（並列実行時に他ページの出力と混ざらない）。
+    """
+
+    header = f"cmd: {' '.join(cmd)}\n\n".encode("utf-8")
+    tail = ""
+    if append:
+        with tempfile.TemporaryFile() as tmp:
+            tmp.write(header)
+            tmp.flush()
+            returncode = subprocess.run(cmd, stdout=tmp, stderr=subprocess.STDOUT).returncode
+            tmp.write(b"\n\n")
+            tmp.seek(0)
+            with _LOG_LOCK, log_path.open("ab") as logf:
+                shutil.copyfileobj(tmp, logf)
+            if returncode != 0:
+                tail = _read_log_tail(tmp)
+    else:
+        with log_path.open("wb") as logf:
+            logf.write(header)
+            logf.flush()
+            returncode = subprocess.run(cmd, stdout=logf, stderr=subprocess.STDOUT).returncode
+        if returncode != 0:
+            # 失敗時だけログ末尾を読み戻してエラー内容を表示する
+            with log_path.open("rb") as fp:
+                tail = _read_log_tail(fp)
+    if returncode != 0:
+        print(f"[ocr] {label} failed (exit={returncode}). see: {log_path}", file=sys.stderr)
+        if tail:
+            print(tail, file=sys.stderr)
+        raise subprocess.CalledProcessError(returncode, cmd)
+
+
+def _run_md_command(cmd: list[str], log_path: Path) -> None:
+    _run_logged(cmd, log_path, "yomitoku")
+
+
+def _ocr_log_path(output_dir: Path, first_page: int, last_page: int | None = None) -> Path:
+    """YomiToku のログはページ（スラブ）ごとに分け、並列実行でも互いに上書きしない。"""
+
+    if last_page is None or last_page == first_page:
+        return output_dir / f"ocr_page_{first_page:03d}.log"
+    return output_dir / f"ocr_pages_{first_page:03d}-{last_page:03d}.log"
+
+
+def _postprocess_page(
     image_path: Path,
     output_dir: Path,
     page_number: int,
     options: OcrOptions,
     icon_config: IconFilterConfig | None = None,
 ) -> None:
-    output_dir.mkdir(parents=True, exist_ok=True)
-    cmd = build_command(image_path, output_dir, options)
-    log_path = output_dir / "ocr.log"
-    result = subprocess.run(cmd, capture_output=True, text=True)
-    log_path.write_text(
-        f"cmd: {' '.join(cmd)}\n\nstdout:\n{result.stdout}\n\nstderr:\n{result.stderr}",
-        encoding="utf-8",
-    )
-    if result.returncode != 0:
-        print(f"[ocr] yomitoku failed (exit={result.returncode}). see: {log_path}", file=sys.stderr)
-        if result.stderr:
-            print(result.stderr, file=sys.stderr)
-        raise subprocess.CalledProcessError(
-            result.returncode, cmd, output=result.stdout, stderr=result.stderr
-        )
-    normalize_markdown_files(output_dir, target_page=page_number)
+    md_files = normalize_markdown_files(output_dir, target_page=page_number)
     page_metrics = _load_page_metrics(image_path)
-    rename_figure_assets(output_dir, page_number, icon_config, page_metrics)
+    rename_figure_assets(output_dir, page_number, icon_config, page_metrics, md_files=md_files)
     if options.fallback_tesseract:
         _maybe_fallback_tesseract(image_path, output_dir, page_number)
     if options.force_tesseract_merge:
         _force_tesseract_merge(image_path, output_dir, page_number)
 
 
+def run_ocr(
+    image_path: Path,
+    output_dir: Path,
+    page_number: int,
+    options: OcrOptions,
+    icon_config: IconFilterConfig | None = None,
+) -> None:
+    output_dir.mkdir(parents=True, exist_ok=True)
+    _run_md_command(build_command(image_path, output_dir, options), _ocr_log_path(output_dir, page_number))
+    _postprocess_page(image_path, output_dir, page_number, options, icon_config)
+
+
+def _run_slab(
+    pages: Sequence[tuple[int, Path]],
+    output_dir: Path,
+    options: OcrOptions,
+    icon_config: IconFilterConfig | None = None,
+) -> None:
+    """複数ページを 1 回の YomiToku 起動（ディレクトリ入力）で処理する。
+
+    YomiToku はディレクトリ内の画像を `<dir>_<stem>_p1.md` として出力するので、
+    ページ番号で `page_NNN.png` としてステージングしておけば既存の正規化処理がそのまま使える。
+    """
+
+    staging = output_dir / BATCH_STAGING_DIR_NAME
+    if staging.exists():
+        shutil.rmtree(staging)
+    staging.mkdir(parents=True)
+    try:
+        for page_number, image_path in pages:
+            staged = staging / f"page_{page_number:03}{image_path.suffix.lower()}"
+            try:
+                os.link(image_path, staged)
+            except OSError:
+                shutil.copy2(image_path, staged)
+        log_path = _ocr_log_path(output_dir, pages[0][0], pages[-1][0])
+        _run_md_command(build_command(staging, output_dir, options), log_path)
+    finally:
+        shutil.rmtree(staging, ignore_errors=True)
+
+    for page_number, image_path in pages:
+        _postprocess_page(image_path, output_dir, page_number, options, icon_config)
+
+
 def export_json(
     image_path: Path,
     output_dir: Path,
@@ -641,17 +884,7 @@ def export_json(
     cmd = build_json_command(image_path, output_dir, options)
     log_dir = Path(output_dir) / "yomi_formats"
     log_dir.mkdir(parents=True, exist_ok=True)
-    log_path = log_dir / "json_export.log"
-    result = subprocess.run(cmd, capture_output=True, text=True)
-    with log_path.open("a", encoding="utf-8") as fp:
-        fp.write(f"cmd: {' '.join(cmd)}\n\nstdout:\n{result.stdout}\nstderr:\n{result.stderr}\n\n")
-    if result.returncode != 0:
-        print(f"[ocr] yomitoku(json) failed (exit={result.returncode}). see: {log_path}", file=sys.stderr)
-        if result.stderr:
-            print(result.stderr, file=sys.stderr)
-        raise subprocess.CalledProcessError(
-            result.returncode, cmd, output=result.stdout, stderr=result.stderr
-        )
+    _run_logged(cmd, log_dir / "json_export.log", "yomitoku(json)", append=True)
 
 
 def run_batch(
@@ -660,11 +893,40 @@ def run_batch(
     start_page: int = 1,
     options: OcrOptions | None = None,
     icon_config: IconFilterConfig | None = None,
+    *,
+    on_page_done: Callable[[int], None] | None = None,
 ) -> None:
+    """ページ画像をまとめて OCR する。
+
+    on_page_done はページの OCR が済むたびに（ページ順・呼び出し元のスレッドで）ページ番号を渡して呼ばれる。
+    """
+
     options = options or OcrOptions()
-    for idx, img in enumerate(image_paths, start=start_page):
-        run_ocr(img, output_dir, idx, options, icon_config)
+    pages = list(enumerate(image_paths, start=start_page))
+    if options.batch_size > 1 and len(pages) > 1:
+        # モデル読み込みを batch_size ページ分まとめて 1 回にする
+        output_dir.mkdir(parents=True, exist_ok=True)
+        for i in range(0, len(pages), options.batch_size):
+            slab = pages[i : i + options.batch_size]
+            _run_slab(slab, output_dir, options, icon_config)
+            if on_page_done is not None:
+                for idx, _ in slab:
+                    on_page_done(idx)
+        return
+    if options.max_workers <= 1 or len(pages) <= 1:
+        for idx, img in pages:
+            run_ocr(img, output_dir, idx, options, icon_config)
+            if on_page_done is not None:
+                on_page_done(idx)
+        return
 
+    # ページごとに独立した YomiToku サブプロセスなので、スレッドで並べれば十分
+    with ThreadPoolExecutor(max_workers=options.max_workers) as pool:
+        futures = [(idx, pool.submit(run_ocr, img, output_dir, idx, options, icon_config)) for idx, img in pages]
+        for idx, future in futures:
+            future.result()
+            if on_page_done is not None:
+                on_page_done(idx)
 
 
 def build_csv_command(image_path: Path, output_dir: Path, options: OcrOptions) -> list[str]:
@@ -706,24 +968,16 @@ def export_csv(
     cmd = build_csv_command(image_path, output_dir, options)
     log_dir = Path(output_dir) / "yomi_formats"
     log_dir.mkdir(parents=True, exist_ok=True)
-    log_path = log_dir / "csv_export.log"
-    result = subprocess.run(cmd, capture_output=True, text=True)
-    with log_path.open("a", encoding="utf-8") as fp:
-        fp.write(f"cmd: {' '.join(cmd)}\n\nstdout:\n{result.stdout}\nstderr:\n{result.stderr}\n\n")
-    if result.returncode != 0:
-        print(f"[ocr] yomitoku(csv) failed (exit={result.returncode}). see: {log_path}", file=sys.stderr)
-        if result.stderr:
-            print(result.stderr, file=sys.stderr)
-        raise subprocess.CalledProcessError(
-            result.returncode, cmd, output=result.stdout, stderr=result.stderr
-        )
+    _run_logged(cmd, log_dir / "csv_export.log", "yomitoku(csv)", append=True)
 
 
 __all__ = [
     "OcrOptions",
     "IconFilterConfig",
+    "PageMetrics",
     "build_command",
     "normalize_markdown_files",
+    "list_page_markdown",
     "rename_figure_assets",
     "run_ocr",
     "run_batch",
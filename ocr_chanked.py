@@ -2,24 +2,37 @@ import argparse
 import json
 import os
 import sys
+import tempfile
 import time
-import platform
+import re
 import subprocess
+from concurrent.futures import Future, ThreadPoolExecutor
 from pathlib import Path
-from typing import Any
+from typing import TYPE_CHECKING, Any
 
-from pdf2image import convert_from_path, pdfinfo_from_path
+from pdf2image import convert_from_path
+from PIL import Image
+
+if TYPE_CHECKING:
+    from math_refiner import MathRefiner
 
-from math_refiner import MathRefiner
 from ocr import (
     IconFilterConfig,
     OcrOptions,
     build_command,
+    run_batch,
     run_ocr,
     update_icon_filter_config,
-    update_icon_filter_config,
     export_json,
     export_csv,
+    list_page_markdown,
+)
+from pdf_pages import (
+    POPPLER_PATH_ENV,
+    cached_page_count,
+    import_pymupdf,
+    resolve_poppler_path,
+    scratch_page_dir,
 )
 
 """PDF をチャンク処理しながら OCR するユーティリティ。
@@ -29,6 +42,13 @@ from ocr import (
 """
 
 
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.environ.get(name, default))
+    except ValueError:
+        return default
+
+
 def parse_args() -> argparse.Namespace:
     parser = argparse.ArgumentParser(description="PDF をチャンク処理で OCR")
     parser.add_argument("pdf_path", help="入力 PDF ファイル")
@@ -52,11 +72,36 @@ def parse_args() -> argparse.Namespace:
         default=10,
         help="チャンク完了後の休憩秒数 (既定: 10)",
     )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=_env_int("OCR_CONCURRENCY", 1),
+        help="チャンク内で同時に走らせる YomiToku の数 (既定: 環境変数 OCR_CONCURRENCY、未設定なら 1 = 逐次)",
+    )
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=1,
+        help="1 回の YomiToku 起動でまとめて処理するページ数 (既定: 1。0 でチャンク全体。モデル読み込みを共有する)",
+    )
     parser.add_argument(
         "--enable-rest",
         action="store_true",
         help="低スペック対策の休憩を有効化 (既定: 無効)",
     )
+    parser.add_argument(
+        "--per-page-rest",
+        type=float,
+        default=0.0,
+        help="--enable-rest 時のページごとの休憩秒数 (既定: 0。従来の挙動は 1.0)",
+    )
+    parser.add_argument(
+        "--page-format",
+        choices=["png", "jpeg"],
+        default="png",
+        help="ページ画像の形式 (default: png)。jpeg は PNG の圧縮コストとファイルサイズを抑えるが、"
+        "page_images/*.png を参照する後段（docx の数式画像など）が使えなくなるため --drop-page-images と併用したときだけ指定できる",
+    )
     parser.add_argument(
         "--mode",
         choices=["lite", "full"],
@@ -129,13 +174,13 @@ def parse_args() -> argparse.Namespace:
         "--icon-log",
         action=argparse.BooleanOptionalAction,
         default=True,
-        help="アイコン候補を icon_candidates.json に記録するか",
+        help="アイコン候補を icon_candidates.jsonl に記録するか",
     )
     parser.add_argument(
         "--icon-log-all",
         action=argparse.BooleanOptionalAction,
         default=False,
-        help="true にすると全図版の統計を all_fig_stats.json に追記",
+        help="true にすると全図版の統計を all_fig_stats.jsonl に追記",
     )
     parser.add_argument(
         "--fallback-tesseract",
@@ -165,8 +210,17 @@ def parse_args() -> argparse.Namespace:
         "--crop",
         help="正規化トリミング範囲（left,top,width,height / 0〜1）。全ページに適用されます。",
     )
-    return parser.parse_args()
+    args = parser.parse_args()
+    if args.page_format == "jpeg" and args.keep_page_images:
+        # 後段は page_NNN.png を探すので、.jpg を残すと数式画像などが黙って見つからなくなる
+        parser.error("--page-format jpeg は --drop-page-images と併用してください（後段は page_images/*.png を参照します）")
+    return args
+
 
+# GUI / dispatcher は -u で起動し、"--- Page n/N ---" などを行単位で読んで進捗にするので行ごとのフラッシュは保つ。
+# ただし -u（write_through）のままだと print 1 回が本文と改行の 2 回の write になるため、1 行 1 回にまとめる
+if hasattr(sys.stdout, "reconfigure"):
+    sys.stdout.reconfigure(line_buffering=True, write_through=False)
 
 args = parse_args()
 
@@ -177,39 +231,21 @@ if not PDF_PATH.exists():
     sys.exit(1)
 
 CHUNK_SIZE = max(1, args.chunk_size)
+WORKERS = max(1, args.workers)
+# 0 はチャンク全体を 1 回の起動で処理する（モデル読み込みはチャンクごとに 1 回）
+BATCH_SIZE = CHUNK_SIZE if args.batch_size == 0 else max(1, args.batch_size)
+RENDER_THREADS = max(1, (os.cpu_count() or 2) - 1)
 REST_SECONDS = max(0, args.rest_seconds) if args.enable_rest else 0
+PAGE_REST_SECONDS = max(0.0, args.per_page_rest) if args.enable_rest else 0.0
 
 # プロジェクト内 poppler
 BASE_DIR = Path(__file__).resolve().parent
 ICON_PROFILE_DIR = BASE_DIR / "configs" / "icon_profiles"
 
-
-def resolve_poppler_path(base_dir: Path) -> Path:
-    system = sys.platform
-    candidates: list[Path] = []
-
-    if system.startswith("win"):
-        candidates.append(base_dir / "poppler" / "win" / "bin")
-        candidates.append(base_dir / "poppler" / "Library" / "bin")  # legacy 互換
-    elif system == "darwin":
-        candidates.append(base_dir / "poppler" / "macos" / "bin")
-        candidates.append(Path("/opt/homebrew/opt/poppler/bin"))
-        candidates.append(Path("/usr/local/opt/poppler/bin"))
-    else:
-        candidates.append(base_dir / "poppler" / system / "bin")
-
-    for path in candidates:
-        if path.exists():
-            return path
-
-    raise FileNotFoundError(
-        "Poppler バイナリが見つかりません。OS ごとの bin ディレクトリを用意するか、"
-        "Homebrew / Choco などでインストールして PATH を設定してください。"
-    )
-
-
 POPPLER_PATH = resolve_poppler_path(BASE_DIR)
-os.environ["PATH"] = str(POPPLER_PATH) + os.pathsep + os.environ.get("PATH", "")
+os.environ[POPPLER_PATH_ENV] = str(POPPLER_PATH)
+if str(POPPLER_PATH) not in os.environ.get("PATH", "").split(os.pathsep):
+    os.environ["PATH"] = str(POPPLER_PATH) + os.pathsep + os.environ.get("PATH", "")
 
 CropRect = tuple[float, float, float, float]
 
@@ -249,6 +285,75 @@ def apply_crop(img, crop: CropRect | None):
 
 CROP = parse_crop(args.crop)
 
+# page_has_math の判定条件（"." は改行に一致しないので「同じ行に 2 つ以上」を表す）
+MATH_HINT_PATTERN = re.compile(r"\$.*\$|\\[(\[]|\^.*\^|_.*_|[∑Σ∫√≤≥≈≒≠∞]")
+
+
+def _render_pages_pymupdf(first_page: int, last_page: int) -> list[tuple[int, Path]] | None:
+    """PyMuPDF があれば、サブプロセスを起こさずプロセス内でページを PNG 化する。無ければ None。"""
+
+    pymupdf = import_pymupdf()
+    if pymupdf is None:
+        return None
+
+    rendered: list[tuple[int, Path]] = []
+    with pymupdf.open(str(PDF_PATH)) as doc:
+        for page in range(first_page, last_page + 1):
+            pix = doc.load_page(page - 1).get_pixmap(dpi=DPI, alpha=False)
+            img_path = RENDER_DIR / f"page_{page:03}{PAGE_SUFFIX}"
+            if CROP or PAGE_FORMAT == "jpeg":
+                image = Image.frombytes("RGB", (pix.width, pix.height), pix.samples)
+                _save_page_image(apply_crop(image, CROP), img_path)
+            else:
+                pix.save(str(img_path))
+            rendered.append((page, img_path))
+    return rendered
+
+
+def _save_page_image(image, img_path: Path) -> None:
+    if PAGE_FORMAT == "jpeg":
+        image.save(img_path, quality=JPEG_QUALITY)
+    else:
+        image.save(img_path)
+
+
+def render_pages(first_page: int, last_page: int) -> list[tuple[int, Path]]:
+    """チャンク分のページを描画し、page_NNN.png（--page-format jpeg なら .jpg）として保存する。
+
+    PyMuPDF が入っていればプロセス内で描画する。無ければ 1 回の convert_from_path（pdftoppm）で
+    チャンク全体をまとめて描画し、ページごとのプロセス起動と PDF 解析を避ける。
+    """
+
+    rendered = _render_pages_pymupdf(first_page, last_page)
+    if rendered is not None:
+        return rendered
+
+    rendered = []
+    # poppler に PNG を直接書かせてパスだけ受け取る。トリミングが無ければ PIL で開き直して再エンコードしない
+    with tempfile.TemporaryDirectory(dir=RENDER_DIR) as render_dir:
+        paths = convert_from_path(
+            str(PDF_PATH),
+            dpi=DPI,
+            first_page=first_page,
+            last_page=last_page,
+            fmt=PAGE_FORMAT,
+            jpegopt={"quality": JPEG_QUALITY} if PAGE_FORMAT == "jpeg" else None,
+            poppler_path=str(POPPLER_PATH),
+            output_folder=render_dir,
+            paths_only=True,
+            # ページ範囲を分割して複数の pdftoppm で並列に描画する（結果はページ順で返る）
+            thread_count=RENDER_THREADS,
+        )
+        for page, src in zip(range(first_page, last_page + 1), paths):
+            img_path = RENDER_DIR / f"page_{page:03}{PAGE_SUFFIX}"
+            if CROP:
+                with Image.open(src) as image:
+                    _save_page_image(apply_crop(image, CROP), img_path)
+            else:
+                os.replace(src, img_path)
+            rendered.append((page, img_path))
+    return rendered
+
 
 def page_has_math(md_paths: list[Path]) -> bool:
     """簡易判定: 数式らしき記号/記法があれば True。
@@ -260,21 +365,14 @@ def page_has_math(md_paths: list[Path]) -> bool:
     - 数式記号集合にマッチ (Σ, ∫, √, ≤, ≥)
     """
 
-    math_symbols = {"∑", "Σ", "∫", "√", "≤", "≥", "≈", "≒", "≠", "∞"}
     for md in md_paths:
         try:
             text = md.read_text(encoding="utf-8")
         except OSError:
             continue
-        for line in text.splitlines():
-            if line.count("$") >= 2:
-                return True
-            if "\\(" in line or "\\[" in line:
-                return True
-            if line.count("^") >= 2 or line.count("_") >= 2:
-                return True
-            if any(sym in line for sym in math_symbols):
-                return True
+        # 行分割せず、全条件をまとめた 1 本の正規表現で最初のヒットまでだけ走査する
+        if MATH_HINT_PATTERN.search(text):
+            return True
     return False
 
 
@@ -284,6 +382,8 @@ OPTIONS = OcrOptions(
     enable_figure=True,
     fallback_tesseract=args.fallback_tesseract,
     force_tesseract_merge=args.force_tesseract_merge,
+    max_workers=WORKERS,
+    batch_size=BATCH_SIZE,
 )
 
 
@@ -349,17 +449,31 @@ def apply_icon_filter_from_args() -> None:
 
 apply_icon_filter_from_args()
 
-MATH_REFINER: MathRefiner | None = None
-if args.math_refiner:
+_MATH_REFINER: "MathRefiner | None" = None
+_MATH_REFINER_DISABLED = not args.math_refiner
+
+
+def get_math_refiner() -> "MathRefiner | None":
+    """--math-refiner 指定時だけ、最初に必要になった時点で MathRefiner を用意する。
+
+    math_refiner は import 時に Pix2Text (torch) を読み込むため、モジュールの import ごと遅延させる。
+    """
+
+    global _MATH_REFINER, _MATH_REFINER_DISABLED
+    if _MATH_REFINER is not None or _MATH_REFINER_DISABLED:
+        return _MATH_REFINER
+    from math_refiner import MathRefiner
+
     try:
-        MATH_REFINER = MathRefiner(
+        _MATH_REFINER = MathRefiner(
             cache_root=args.math_cache,
             min_score=args.math_score,
             resized_shape=args.math_resized_shape,
         )
     except RuntimeError as exc:
         print(f"MathRefiner の初期化に失敗したため無効化します: {exc}")
-        MATH_REFINER = None
+        _MATH_REFINER_DISABLED = True
+    return _MATH_REFINER
 
 
 def run_merger(base_name: str):
@@ -380,9 +494,13 @@ def run_merger(base_name: str):
     subprocess.run(cmd, check=True)
 
 DPI = max(72, int(args.dpi))
+PAGE_FORMAT = args.page_format
+PAGE_SUFFIX = ".jpg" if PAGE_FORMAT == "jpeg" else ".png"
+JPEG_QUALITY = 90
+
+PDFINFO_CACHE_NAME = ".pdfinfo_cache.json"
 
-info = pdfinfo_from_path(str(PDF_PATH), poppler_path=str(POPPLER_PATH))
-num_pages = int(info["Pages"])
+num_pages = cached_page_count(PDF_PATH, POPPLER_PATH, args.output_root / PDFINFO_CACHE_NAME)
 
 start_page_limit = max(1, args.start)
 end_page_limit = args.end if args.end is not None else num_pages
@@ -405,99 +523,148 @@ OUT_DIR.mkdir(parents=True, exist_ok=True)
 PAGE_IMAGE_DIR = OUT_DIR / "page_images"
 PAGE_IMAGE_DIR.mkdir(exist_ok=True)
 
+
+# --drop-page-images 時は RAM 上 (/dev/shm) の一時ディレクトリに描画する
+RENDER_DIR = PAGE_IMAGE_DIR if args.keep_page_images else scratch_page_dir(PAGE_IMAGE_DIR)
+
 print(f"PDF: {PDF_PATH}")
 print(f"出力ディレクトリ: {OUT_DIR}")
 print(f"総ページ数: {num_pages}")
 print(f"処理範囲: {start_page_limit}〜{end_page_limit}")
 print(f"チャンクサイズ: {CHUNK_SIZE}")
+print(f"並列ワーカー数: {WORKERS}")
+print(f"YomiToku バッチサイズ: {BATCH_SIZE}")
 if REST_SECONDS > 0:
     print(f"チャンク休憩: {REST_SECONDS} 秒 (有効)")
 else:
     print("チャンク休憩: 無効 ( --enable-rest を指定で有効化 )")
 print(f"poppler path: {POPPLER_PATH}")
 
-current = start_page_limit
-chunk_index = 1
+def print_page_marker(page: int) -> None:
+    # GUI（Tauri）はこの行と "--- Done n/N ---" で進捗と ETA を計算する
+    print(f"\n--- Page {page}/{end_page_limit} (abs {page}/{num_pages}) ---")
 
-while current <= end_page_limit:
-    chunk_start = current
-    chunk_end = min(current + CHUNK_SIZE - 1, end_page_limit)
 
-    print(f"\n=== Chunk {chunk_index}: {chunk_start}〜{chunk_end} ===")
+def finish_page(page: int, img_path: Path) -> None:
+    """OCR 済みページの JSON/CSV 出力・MathRefiner・ページ画像の後始末を行い、Done を出す。"""
 
-    for page in range(chunk_start, chunk_end + 1):
-        print(f"\n--- Page {page}/{end_page_limit} (abs {page}/{num_pages}) ---")
+    md_paths = sorted(list_page_markdown(OUT_DIR, page))
 
-        images = convert_from_path(
-            str(PDF_PATH),
-            dpi=DPI,
-            first_page=page,
-            last_page=page,
-            fmt="png",
-            poppler_path=str(POPPLER_PATH),
+    should_emit_json = args.emit_json == "on" or (
+        args.emit_json == "auto" and page_has_math(md_paths)
+    )
+
+    if should_emit_json:
+        try:
+            export_json(img_path, OUT_DIR, OPTIONS)
+        except subprocess.CalledProcessError as exc:
+            print(f"JSON 出力に失敗しました (page {page}): {exc}")
+    elif args.emit_json == "auto":
+        print("JSON スキップ (数式なし判定)")
+
+    if args.emit_csv:
+        try:
+            export_csv(img_path, OUT_DIR, OPTIONS)
+        except subprocess.CalledProcessError as exc:
+            print(f"CSV 出力に失敗しました (page {page}): {exc}")
+
+    math_refiner = get_math_refiner() if md_paths else None
+    if math_refiner:
+        result = math_refiner.refine_page(
+            page_md_paths=md_paths,
+            image_path=img_path,
+            page_number=page,
         )
-        img = apply_crop(images[0], CROP)
+        if result.replaced:
+            print(
+                f"MathRefiner: {result.replaced} 件の数式を置換 (未使用 {result.unused})"
+            )
+        elif result.unused:
+            print(
+                f"MathRefiner: 数式を {result.unused} 件検出しましたが置換対象がありませんでした"
+            )
 
-        img_path = PAGE_IMAGE_DIR / f"page_{page:03}.png"
-        img.save(img_path)
-        del img
+    if not args.keep_page_images:
+        try:
+            img_path.unlink()
+        except FileNotFoundError:
+            pass
 
-        preview_cmd = build_command(img_path, OUT_DIR, OPTIONS)
-        print(" ".join(preview_cmd))
-        run_ocr(img_path, OUT_DIR, page_number=page, options=OPTIONS)
+    print(f"--- Done {page}/{end_page_limit} ---")
+    if PAGE_REST_SECONDS > 0:
+        time.sleep(PAGE_REST_SECONDS)  # ページごとの軽い休憩
 
-        md_paths = sorted(OUT_DIR.glob(f"page_{page:03}*.md"))
 
-        should_emit_json = args.emit_json == "on" or (
-            args.emit_json == "auto" and page_has_math(md_paths)
-        )
+current = start_page_limit
+chunk_index = 1
 
-        if should_emit_json:
-            try:
-                export_json(img_path, OUT_DIR, OPTIONS)
-            except subprocess.CalledProcessError as exc:
-                print(f"JSON 出力に失敗しました (page {page}): {exc}")
-        elif args.emit_json == "auto":
-            print("JSON スキップ (数式なし判定)")
-
-        if args.emit_csv:
-            try:
-                export_csv(img_path, OUT_DIR, OPTIONS)
-            except subprocess.CalledProcessError as exc:
-                print(f"CSV 出力に失敗しました (page {page}): {exc}")
-
-        if MATH_REFINER and md_paths:
-            result = MATH_REFINER.refine_page(
-                page_md_paths=md_paths,
-                image_path=img_path,
-                page_number=page,
+# 描画（poppler / PyMuPDF）と OCR（YomiToku）は別の資源を使うので、次チャンクの描画を
+# 1 チャンク分だけ先行させて重ねる。休憩を有効にした低スペック運用では従来どおり直列にする。
+RENDERER = ThreadPoolExecutor(max_workers=1) if REST_SECONDS <= 0 and PAGE_REST_SECONDS <= 0 else None
+next_render: Future[list[tuple[int, Path]]] | None = None
+
+# OCR が例外で止まったときに、先行描画中の次チャンクを待たずに終われるよう必ず後始末する
+try:
+    while current <= end_page_limit:
+        chunk_start = current
+        chunk_end = min(current + CHUNK_SIZE - 1, end_page_limit)
+
+        print(f"\n=== Chunk {chunk_index}: {chunk_start}〜{chunk_end} ===")
+
+        rendered = next_render.result() if next_render is not None else render_pages(chunk_start, chunk_end)
+        next_render = None
+        if RENDERER is not None and chunk_end < end_page_limit:
+            next_start = chunk_end + 1
+            next_render = RENDERER.submit(
+                render_pages, next_start, min(next_start + CHUNK_SIZE - 1, end_page_limit)
             )
-            if result.replaced:
-                print(
-                    f"MathRefiner: {result.replaced} 件の数式を置換 (未使用 {result.unused})"
-                )
-            elif result.unused:
-                print(
-                    f"MathRefiner: 数式を {result.unused} 件検出しましたが置換対象がありませんでした"
-                )
-
-        if not args.keep_page_images:
-            try:
-                img_path.unlink()
-            except FileNotFoundError:
-                pass
-
-        print(f"--- Done {page}/{end_page_limit} ---")
-        time.sleep(1.0)  # ページごとの軽い休憩
-
-    if REST_SECONDS > 0:
-        print(f"\n=== Chunk {chunk_index} 完了 → {REST_SECONDS} 秒休憩 ===")
-        time.sleep(REST_SECONDS)
-    else:
-        print(f"\n=== Chunk {chunk_index} 完了 → 休憩なし ===")
+        batched = WORKERS > 1 or BATCH_SIZE > 1
+        if batched:
+            # チャンク内の OCR は run_batch にまとめて渡す（batch_size>1 ならモデル読み込みを共有、
+            # それ以外は max_workers 並列）。JSON/CSV 出力や MathRefiner（モデルを抱えている）は
+            # ページの OCR が済むたびに呼ばれる on_page_done の中で、メインスレッドから順に行う。
+            if BATCH_SIZE <= 1:
+                for page, img_path in rendered:
+                    print(" ".join(build_command(img_path, OUT_DIR, OPTIONS)))
+            page_images = dict(rendered)
+            chunk_pages = [page for page, _ in rendered]
+
+            def on_page_done(page: int) -> None:
+                finish_page(page, page_images[page])
+                # GUI は Page→Done の間隔で ETA を出すので、次ページの Page は直前ページの完了時点で出す
+                # （並列/まとめ実行でも、間隔がページあたりの実処理時間になる）
+                next_index = chunk_pages.index(page) + 1
+                if next_index < len(chunk_pages):
+                    print_page_marker(chunk_pages[next_index])
+
+            if chunk_pages:
+                print_page_marker(chunk_pages[0])
+            run_batch(
+                [img_path for _, img_path in rendered],
+                OUT_DIR,
+                start_page=chunk_start,
+                options=OPTIONS,
+                on_page_done=on_page_done,
+            )
+        else:
+            for page, img_path in rendered:
+                print_page_marker(page)
+                preview_cmd = build_command(img_path, OUT_DIR, OPTIONS)
+                print(" ".join(preview_cmd))
+                run_ocr(img_path, OUT_DIR, page_number=page, options=OPTIONS)
+                finish_page(page, img_path)
+
+        if REST_SECONDS > 0:
+            print(f"\n=== Chunk {chunk_index} 完了 → {REST_SECONDS} 秒休憩 ===")
+            time.sleep(REST_SECONDS)
+        else:
+            print(f"\n=== Chunk {chunk_index} 完了 → 休憩なし ===")
 
-    current += CHUNK_SIZE
-    chunk_index += 1
+        current += CHUNK_SIZE
+        chunk_index += 1
+finally:
+    if RENDERER is not None:
+        RENDERER.shutdown(cancel_futures=True)
 
 run_merger(output_dir_name)
 
@@ -0,0 +1,111 @@
+"""ocr_chanked.py と ui_preview.py で共有する PDF ページまわりの補助関数。"""
+
+from __future__ import annotations
+
+import atexit
+import json
+import os
+import shutil
+import sys
+import tempfile
+from pathlib import Path
+
+# 解決済みの Poppler bin を子プロセスへ引き継ぐための環境変数
+POPPLER_PATH_ENV = "OCR_POPPLER_PATH"
+PDFINFO_CACHE_MAX_ENTRIES = 64
+
+
+def resolve_poppler_path(base_dir: Path) -> Path:
+    # 環境変数で明示（または親プロセスで解決済み）なら候補の存在確認（stat）を省く
+    cached = os.environ.get(POPPLER_PATH_ENV)
+    if cached:
+        return Path(cached)
+
+    system = sys.platform
+    candidates: list[Path] = []
+
+    if system.startswith("win"):
+        candidates.append(base_dir / "poppler" / "win" / "bin")
+        candidates.append(base_dir / "poppler" / "Library" / "bin")  # legacy 互換
+    elif system == "darwin":
+        candidates.append(base_dir / "poppler" / "macos" / "bin")
+        candidates.append(Path("/opt/homebrew/opt/poppler/bin"))
+        candidates.append(Path("/usr/local/opt/poppler/bin"))
+    else:
+        candidates.append(base_dir / "poppler" / system / "bin")
+
+    for path in candidates:
+        if path.exists():
+            return path
+
+    raise FileNotFoundError(
+        "Poppler バイナリが見つかりません。OS ごとの bin ディレクトリを用意するか、"
+        "Homebrew / Choco などでインストールして PATH を設定してください。"
+    )
+
+
+def cached_page_count(pdf_path: Path, poppler_path: Path, cache_path: Path) -> int:
+    """PDF のページ数を返す。サイズと更新時刻が同じなら前回の pdfinfo 結果を再利用する。
+
+    --start/--end の分割実行やプレビューのページ移動のたびに pdfinfo を起動しないためのキャッシュ。
+    """
+
+    from pdf2image import pdfinfo_from_path
+
+    stat = pdf_path.stat()
+    key = str(pdf_path.resolve())
+    signature = [stat.st_size, stat.st_mtime_ns]
+    try:
+        cache = json.loads(cache_path.read_text(encoding="utf-8"))
+    except (OSError, json.JSONDecodeError):
+        cache = {}
+    if not isinstance(cache, dict):
+        cache = {}
+    entry = cache.get(key)
+    if isinstance(entry, dict) and entry.get("signature") == signature:
+        return int(entry["pages"])
+
+    info = pdfinfo_from_path(str(pdf_path), poppler_path=str(poppler_path))
+    pages = int(info["Pages"])
+    cache.pop(key, None)
+    cache[key] = {"signature": signature, "pages": pages}
+    # 古いものから捨てて、キャッシュが増え続けないようにする
+    for stale in list(cache)[:-PDFINFO_CACHE_MAX_ENTRIES]:
+        del cache[stale]
+    try:
+        cache_path.parent.mkdir(parents=True, exist_ok=True)
+        cache_path.write_text(json.dumps(cache, ensure_ascii=False), encoding="utf-8")
+    except OSError as exc:
+        # キャッシュは best-effort。ui_preview の stdout は JSON 専用なので警告は stderr に出す
+        print(f"警告: pdfinfo キャッシュを書き込めませんでした: {exc}", file=sys.stderr)
+    return pages
+
+
+def import_pymupdf():
+    """任意依存の PyMuPDF を import する。無ければ None。"""
+
+    try:
+        import pymupdf  # type: ignore
+    except ImportError:
+        try:
+            import fitz as pymupdf  # type: ignore  # 旧版 PyMuPDF のモジュール名
+        except ImportError:
+            return None
+    return pymupdf
+
+
+def scratch_page_dir(page_image_dir: Path, *, shm: Path = Path("/dev/shm")) -> Path:
+    """ページ画像を残さない場合の描画先。RAM 上 (/dev/shm) に書いてディスク I/O を避ける。
+
+    YomiToku は出力名を `<親ディレクトリ名>_<stem>_p1.*` にするので、一時ディレクトリの中に
+    page_image_dir と同じ名前のディレクトリを作り、JSON/CSV のファイル名を通常時と揃える。
+    /dev/shm が使えなければ page_image_dir をそのまま返す。
+    """
+
+    if not shm.is_dir() or not os.access(shm, os.W_OK):
+        return page_image_dir
+    root = Path(tempfile.mkdtemp(prefix="ocr_pages_", dir=shm))
+    atexit.register(shutil.rmtree, root, ignore_errors=True)
+    scratch = root / page_image_dir.name
+    scratch.mkdir()
+    return scratch
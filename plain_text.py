@@ -27,21 +27,49 @@ TEX_INLINE_PATTERN = re.compile(r"\$(?P<body>[^$]+)\$")
 TEX_PAREN_PATTERN = re.compile(r"\\\((?P<body>[\s\S]+?)\\\)")
 TEX_BRACKET_PATTERN = re.compile(r"\\\[(?P<body>[\s\S]+?)\\\]")
 
+HTML_TAG_PATTERN = re.compile(r"</?[^>]+>")
+BLANK_LINES_PATTERN = re.compile(r"\n{3,}")
+# str.splitlines が "\n" 以外に行区切りとして扱う文字
+OTHER_LINE_BREAK_PATTERN = re.compile("[\r\x0b\x0c\x1c\x1d\x1e\x85\u2028\u2029]")
+
+
+def _strip_math_body(match: re.Match[str]) -> str:
+    return match.group("body").strip()
+
+
+_MATH_DELIMITER_PATTERNS = (
+    TEX_BLOCK_INLINE_PATTERN,
+    TEX_PAREN_PATTERN,
+    TEX_BRACKET_PATTERN,
+    TEX_INLINE_PATTERN,
+)
+
 
 def _strip_math_delimiters(text: str) -> str:
     if not text:
         return ""
 
-    prev = None
-    while prev != text:
-        prev = text
-        text = TEX_BLOCK_INLINE_PATTERN.sub(lambda m: m.group("body").strip(), text)
-        text = TEX_PAREN_PATTERN.sub(lambda m: m.group("body").strip(), text)
-        text = TEX_BRACKET_PATTERN.sub(lambda m: m.group("body").strip(), text)
-        text = TEX_INLINE_PATTERN.sub(lambda m: m.group("body").strip(), text)
+    # 置換は必ず区切り記号を取り除くので、置換が 1 件も起きなければ不動点に達している。
+    # 前回との全文比較の代わりに件数で判定し、区切りの材料（$ / \）が消えた時点でも打ち切る
+    while "$" in text or "\\" in text:
+        replaced = 0
+        for pattern in _MATH_DELIMITER_PATTERNS:
+            text, count = pattern.subn(_strip_math_body, text)
+            replaced += count
+        if not replaced:
+            break
     return text
 
 
+def _strip_html_tags(text: str) -> str:
+    # 最後の ">" より後ろの "<" はどれも閉じられないので照合させない。
+    # そこを除けば各 "<" からの照合は成功するか即失敗するかなので、全体が線形になる
+    end = text.rfind(">") + 1
+    if not end:
+        return text
+    return HTML_TAG_PATTERN.sub("", text[:end]) + text[end:]
+
+
 def _md_table_row_to_tsv(line: str) -> str:
     stripped = line.strip()
     if stripped.startswith("|"):
@@ -62,51 +90,75 @@ def to_plain_text(md: str) -> str:
 
     text = md or ""
 
+    # 各置換は順序に依存する（例: `***x***` や `# > 引用`）ので 1 本の正規表現には融合しない。
+    # 代わりに、きっかけの文字が無いパスは丸ごと飛ばし、グループ参照はテンプレート（C 側で展開）で済ませる。
+
     # normalize <br> early
     text = text.replace("<br>", "\n")
 
     # code fences: keep contents, drop markers
-    text = CODE_FENCE_OPEN_PATTERN.sub("", text)
-    text = CODE_FENCE_CLOSE_PATTERN.sub("", text)
+    if "```" in text:
+        text = CODE_FENCE_OPEN_PATTERN.sub("", text)
+        text = CODE_FENCE_CLOSE_PATTERN.sub("", text)
 
     # images: markdown/html -> [画像: url]
-    text = IMG_HTML_PATTERN.sub(lambda m: f"[画像: {m.group('url')}]", text)
-    text = IMG_MD_PATTERN.sub(lambda m: f"[画像: {m.group('url')}]", text)
+    if "<" in text:
+        text = IMG_HTML_PATTERN.sub(r"[画像: \g<url>]", text)
+    if "](" in text:
+        text = IMG_MD_PATTERN.sub(r"[画像: \g<url>]", text)
 
-    # links: [text](url) -> text
-    text = LINK_MD_PATTERN.sub(lambda m: m.group("text"), text)
+        # links: [text](url) -> text
+        text = LINK_MD_PATTERN.sub(r"\g<text>", text)
 
     # headings / blockquotes / hr
-    text = HEADING_PATTERN.sub("", text)
-    text = BLOCKQUOTE_PATTERN.sub("", text)
-    text = HR_PATTERN.sub("", text)
+    if "#" in text:
+        text = HEADING_PATTERN.sub("", text)
+    if ">" in text:
+        text = BLOCKQUOTE_PATTERN.sub("", text)
+    if "-" in text or "*" in text or "_" in text:
+        text = HR_PATTERN.sub("", text)
 
     # tables: convert row lines to TSV (drop divider)
-    lines = text.splitlines()
-    converted: list[str] = []
-    for line in lines:
-        if TABLE_DIVIDER_PATTERN.match(line):
-            continue
-        if TABLE_ROW_PATTERN.match(line) and line.count("|") >= 2:
-            converted.append(_md_table_row_to_tsv(line))
-            continue
-        converted.append(line)
-    text = "\n".join(converted)
+    if "|" in text:
+        lines = text.splitlines()
+        converted: list[str] = []
+        for line in lines:
+            # 区切り行・表の行はどちらも "|" を含むので、含まない行は照合せずそのまま通す
+            if "|" not in line:
+                converted.append(line)
+                continue
+            if TABLE_DIVIDER_PATTERN.match(line):
+                continue
+            if TABLE_ROW_PATTERN.match(line) and line.count("|") >= 2:
+                converted.append(_md_table_row_to_tsv(line))
+                continue
+            converted.append(line)
+        text = "\n".join(converted)
+    elif OTHER_LINE_BREAK_PATTERN.search(text):
+        # 表が無くても改行コードの正規化（splitlines 相当）は従来どおり行う。
+        # "\n" だけの文書では末尾改行以外は変わらず、末尾は最後の strip で消えるので全文コピーを省く
+        text = "\n".join(text.splitlines())
 
     # inline code & emphasis markers
-    text = INLINE_CODE_PATTERN.sub(lambda m: m.group(1), text)
-    text = EM_STRONG_PATTERN.sub(lambda m: m.group(1), text)
-    text = EM_STRONG_UNDER_PATTERN.sub(lambda m: m.group(1), text)
-    text = EM_PATTERN.sub(lambda m: m.group(1), text)
-    text = EM_UNDER_PATTERN.sub(lambda m: m.group(1), text)
+    if "`" in text:
+        text = INLINE_CODE_PATTERN.sub(r"\1", text)
+    if "*" in text:
+        text = EM_STRONG_PATTERN.sub(r"\1", text)
+    if "_" in text:
+        text = EM_STRONG_UNDER_PATTERN.sub(r"\1", text)
+    if "*" in text:
+        text = EM_PATTERN.sub(r"\1", text)
+    if "_" in text:
+        text = EM_UNDER_PATTERN.sub(r"\1", text)
 
     # strip math delimiters last (after link/image handling)
-    text = _strip_math_delimiters(text)
+    if "$" in text or "\\" in text:
+        text = _strip_math_delimiters(text)
 
     # drop remaining html tags
-    text = re.sub(r"</?[^>]+>", "", text)
+    if "<" in text:
+        text = _strip_html_tags(text)
 
     # normalize blank lines
-    text = re.sub(r"\n{3,}", "\n\n", text).strip()
+    text = BLANK_LINES_PATTERN.sub("\n\n", text).strip()
     return text
-
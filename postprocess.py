@@ -4,6 +4,7 @@ from __future__ import annotations
 
 import argparse
 import csv
+import os
 import re
 from dataclasses import dataclass
 from pathlib import Path
@@ -14,8 +15,16 @@ from markdown_cleanup import clean_file
 INPUT_DIR = Path("result")
 DEFAULT_OUTPUT = Path("merged.md")
 PATTERN = re.compile(r"(?:.*_)?page_?(\d+)(?:_p(\d+))?\.md$")
-FRACTION_KEYWORDS = ("比率", "割合", "分数", "比率", "率", "比")
+FRACTION_KEYWORDS = ("比率", "割合", "分数", "率", "比")
 FRACTION_SYMBOLS = ("/", "÷", "×", "%", "％")
+# 「等号系」「分数記号」「分数キーワード」を全部含む行を、先読み 3 つの 1 回の照合で判定する
+FRACTION_LINE_PATTERN = re.compile(
+    "(?=.*[=≒≠])"
+    "(?=.*(?:" + "|".join(map(re.escape, FRACTION_SYMBOLS)) + "))"
+    "(?=.*(?:" + "|".join(map(re.escape, FRACTION_KEYWORDS)) + "))",
+    re.DOTALL,
+)
+JAPANESE_CHAR_PATTERN = re.compile("[\u3040-\u9FFF]")
 
 
 @dataclass(order=True)
@@ -35,13 +44,19 @@ class MathIssue:
 
 def collect_md_files(input_dir: Path = INPUT_DIR) -> List[PageFile]:
     files: List[PageFile] = []
-    for md in input_dir.glob("*.md"):
-        match = PATTERN.match(md.name)
-        if not match:
-            continue
-        page = int(match.group(1))
-        part = int(match.group(2)) if match.group(2) else 0
-        files.append(PageFile(page, part, md))
+    # Path.glob より軽い scandir で走査し、名前の判定は PATTERN の 1 回の照合で済ませる
+    try:
+        it = os.scandir(input_dir)
+    except (FileNotFoundError, NotADirectoryError):
+        return files
+    with it:
+        for entry in it:
+            if not entry.name.endswith(".md"):
+                continue
+            match = PATTERN.match(entry.name)
+            if not match or not entry.is_file():
+                continue
+            files.append(PageFile(int(match[1]), int(match[2] or 0), Path(entry.path)))
     files.sort()
     return files
 
@@ -55,36 +70,43 @@ def write_merged_md(
     issues: List[MathIssue] = []
     with output_path.open("w", encoding="utf-8") as out:
         current_page: int | None = None
-        page_chunks: list[str] = []
+        page_started = False
+        page_line = 1
         first_section = True
 
-        def flush_page(page: int | None) -> None:
-            nonlocal first_section
-            if page is None:
-                return
-            page_text = "\n\n".join(chunk for chunk in page_chunks if chunk.strip())
-            page_chunks.clear()
-            if not page_text.strip():
-                return
-            if add_page_heading:
-                if not first_section:
-                    out.write("\n")
-                out.write(f"# Page {page}\n\n")
-                first_section = False
-            out.write(page_text + "\n\n")
-            detected = detect_math_issues(page_text, page)
-            if detected:
-                issues.extend(detected)
+        # ページ全体を "\n\n".join で組み立てず、ファイル単位で読んでその場で書き出す。
+        # 数式チェックの行番号は、結合後のページ本文での位置（区切りの空行を含む）に合わせる
+        def write_chunk(page: int, chunk: str) -> None:
+            nonlocal first_section, page_started, page_line
+            if not page_started:
+                if add_page_heading:
+                    if not first_section:
+                        out.write("\n")
+                    out.write(f"# Page {page}\n\n")
+                    first_section = False
+                page_started = True
+            else:
+                out.write("\n\n")
+            out.write(chunk)
+            issues.extend(detect_math_issues(chunk, page, start_line=page_line))
+            page_line += len(chunk.splitlines()) + 1
+
+        def finish_page() -> None:
+            nonlocal page_started, page_line
+            if page_started:
+                out.write("\n\n")
+            page_started = False
+            page_line = 1
 
         for entry in files:
-            if current_page is None:
-                current_page = entry.page
-            elif entry.page != current_page:
-                flush_page(current_page)
+            if entry.page != current_page:
+                finish_page()
                 current_page = entry.page
-            page_chunks.append(entry.path.read_text(encoding="utf-8").strip())
+            chunk = entry.path.read_text(encoding="utf-8").strip()
+            if chunk:
+                write_chunk(entry.page, chunk)
 
-        flush_page(current_page)
+        finish_page()
 
     return issues
 
@@ -97,9 +119,9 @@ def cleanup(files: Iterable[PageFile]) -> None:
             pass
 
 
-def detect_math_issues(text: str, page: int) -> List[MathIssue]:
+def detect_math_issues(text: str, page: int, start_line: int = 1) -> List[MathIssue]:
     issues: List[MathIssue] = []
-    for idx, line in enumerate(text.splitlines(), start=1):
+    for idx, line in enumerate(text.splitlines(), start=start_line):
         stripped = line.strip()
         if not stripped:
             continue
@@ -114,17 +136,14 @@ def detect_math_issues(text: str, page: int) -> List[MathIssue]:
 
 
 def looks_like_fraction(text: str) -> bool:
-    if not any(sym in text for sym in ("=", "≒", "≠")):
-        return False
-    if not any(sym in text for sym in FRACTION_SYMBOLS):
-        return False
-    return any(keyword in text for keyword in FRACTION_KEYWORDS)
+    # match は先頭に固定されるので、先読みは行頭から 1 回ずつしか走らない
+    return FRACTION_LINE_PATTERN.match(text) is not None
 
 
 def noisy_dollar(text: str) -> bool:
     if text.count("$") < 2:
         return False
-    return any("\u3040" <= ch <= "\u9FFF" for ch in text)
+    return JAPANESE_CHAR_PATTERN.search(text) is not None
 
 
 def inject_page_image(out_stream, page: int, image_dir: Path) -> None:
@@ -172,8 +191,8 @@ def main(argv: list[str] | None = None) -> None:
         add_page_heading=not args.no_heading,
     )
     write_math_review_log(input_dir / "math_review.csv", issues)
-    clean_file(output_path, inplace=True)
-    clean_file(output_path, inplace=True)  # run twice to ensure backrefs are cleared after layout injection
+    # 2 回目の整形で backref が消える場合があるため 2 パス（読み書きは 1 回）
+    clean_file(output_path, inplace=True, max_passes=2)
 
     cleanup(files)
     print("ページ単位の md ファイルを削除しました（デフォルト動作）。")
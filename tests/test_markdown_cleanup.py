@@ -24,6 +24,18 @@ class MarkdownCleanupTests(unittest.TestCase):
             self.assertNotIn("$$", cleaned)
             self.assertNotIn("$n+11-a$", cleaned)
 
+    def test_max_passes_matches_repeated_clean_file(self) -> None:
+        source = "# Page 1\n\n$$ $n+11-a$ $$\n\\( x \\)\n\n# Page 2\n\n## 見出し\n本文"
+        with tempfile.TemporaryDirectory() as tmpdir:
+            twice = Path(tmpdir) / "twice.md"
+            once = Path(tmpdir) / "once.md"
+            twice.write_text(source, encoding="utf-8")
+            once.write_text(source, encoding="utf-8")
+            clean_file(twice, inplace=True)
+            clean_file(twice, inplace=True)
+            clean_file(once, inplace=True, max_passes=2)
+            self.assertEqual(once.read_text(encoding="utf-8"), twice.read_text(encoding="utf-8"))
+
     def test_log_base_two(self) -> None:
         line = "$log^{2} n$"
         cleaned = clean_text(line)
@@ -0,0 +1,100 @@
+import json
+
+from PIL import Image
+
+from math_snippet_extractor import MathRegion, insert_links, load_regions, save_regions
+
+
+def test_load_regions_filters_and_sorts_candidates(tmp_path):
+    json_path = tmp_path / "sample_page_images_page_003.json"
+    json_path.write_text(
+        json.dumps(
+            {
+                "paragraphs": [
+                    {"contents": "x+y=12", "box": [100, 50, 10, 20], "score": 0.7},
+                    {"contents": "ただの本文です", "box": [0, 0, 50, 20], "score": 0.9},
+                    {"contents": "1+1=2", "box": [0, 0, 500, 10], "score": 0.9},
+                ],
+                "detections": [
+                    {"content": "a/b=0.5", "points": [[5, 5], [45, 5], [45, 25], [5, 25]], "rec_score": 0.95},
+                    {"content": "3×4=12", "points": [[0, 0], [30, 0], [30, 20], [0, 20]], "rec_score": 0.3},
+                ],
+            }
+        ),
+        encoding="utf-8",
+    )
+
+    regions = load_regions(json_path, min_score=0.6, min_ops=1, max_chars=120, max_aspect=6.0)
+
+    assert [(r.page, r.box, r.text) for r in regions] == [
+        (3, (5, 5, 45, 25), "a/b=0.5"),
+        (3, (10, 20, 100, 50), "x+y=12"),
+    ]
+
+
+def test_load_regions_drops_duplicate_boxes(tmp_path):
+    json_path = tmp_path / "sample_page_images_page_001.json"
+    json_path.write_text(
+        json.dumps(
+            {
+                "paragraphs": [{"contents": "x+y=12", "box": [16, 16, 80, 40], "score": 0.7}],
+                "detections": [
+                    {"content": "x+y=12", "points": [[17, 18], [81, 18], [81, 41], [17, 41]], "rec_score": 0.9},
+                ],
+            }
+        ),
+        encoding="utf-8",
+    )
+
+    regions = load_regions(json_path, min_score=0.6, min_ops=1, max_chars=120, max_aspect=6.0)
+
+    assert [(r.box, r.score) for r in regions] == [((17, 18, 81, 41), 0.9)]
+
+
+def test_save_regions_crops_each_page_up_to_limit(tmp_path):
+    page_dir = tmp_path / "page_images"
+    page_dir.mkdir()
+    Image.new("RGB", (100, 80), "white").save(page_dir / "page_001.png")
+    regions = [
+        MathRegion(page=1, box=(10, 10, 40, 30), score=0.9, text="a+b"),
+        MathRegion(page=1, box=(50, 40, 90, 70), score=0.8, text="c=d"),
+        MathRegion(page=2, box=(0, 0, 10, 10), score=0.9, text="1+1"),
+    ]
+
+    saved = save_regions(regions, page_dir, tmp_path / "figures", padding=2, max_per_page=1)
+
+    assert saved == {1: [("eq_page001_01.png", "a+b")]}
+    with Image.open(tmp_path / "figures" / "eq_page001_01.png") as img:
+        assert img.size == (34, 24)
+
+
+def test_insert_links_places_image_after_matching_line(tmp_path):
+    merged = tmp_path / "sample_merged.md"
+    merged.write_text(
+        "# Page 1\n"
+        "本文です\n"
+        "$x + y = 10$\n"
+        "![eq](figures/eq_page001_09.png)\n"
+        "末尾\n",
+        encoding="utf-8",
+    )
+    out = tmp_path / "out.md"
+
+    insert_links(merged, out, {1: [("eq_page001_01.png", "x+y=10")]})
+
+    lines = out.read_text(encoding="utf-8").splitlines()
+    assert "![eq](figures/eq_page001_09.png)" not in lines
+    idx = lines.index("$x + y = 10$")
+    assert lines[idx + 2] == "![eq](figures/eq_page001_01.png)"
+    assert lines[-1] == "末尾"
+
+
+def test_insert_links_appends_unmatched_images_at_page_end(tmp_path):
+    merged = tmp_path / "sample_merged.md"
+    merged.write_text("# Page 1\n本文\n# Page 2\n次\n", encoding="utf-8")
+    out = tmp_path / "out.md"
+
+    insert_links(merged, out, {1: [("eq_page001_01.png", "a/b")]})
+
+    lines = out.read_text(encoding="utf-8").splitlines()
+    assert lines.index("![eq](figures/eq_page001_01.png)") < lines.index("# Page 2")
@@ -0,0 +1,110 @@
+import subprocess
+from pathlib import Path
+
+
+def _fake_yomitoku(cmd, **kwargs):
+    # YomiToku のディレクトリ入力と同じ命名: <dir>_<stem>_p1.md
+    src = Path(cmd[3])
+    out = Path(cmd[cmd.index("-o") + 1])
+    targets = sorted(src.iterdir()) if src.is_dir() else [src]
+    for img in targets:
+        (out / f"{img.parent.name}_{img.stem}_p1.md").write_text(f"text of {img.name}", encoding="utf-8")
+    return subprocess.CompletedProcess(cmd, 0, stdout="", stderr="")
+
+
+def test_run_batch_groups_pages_into_one_yomitoku_call(tmp_path, monkeypatch):
+    import ocr
+
+    calls = []
+
+    def fake_run(cmd, **kwargs):
+        calls.append(cmd)
+        return _fake_yomitoku(cmd, **kwargs)
+
+    monkeypatch.setattr(ocr.subprocess, "run", fake_run)
+
+    images = []
+    for name in ("scan_a.png", "scan_b.png", "scan_c.png"):
+        path = tmp_path / name
+        path.write_bytes(b"")
+        images.append(path)
+    output_dir = tmp_path / "result"
+
+    ocr.run_batch(images, output_dir, start_page=4, options=ocr.OcrOptions(batch_size=2))
+
+    assert len(calls) == 2
+    assert sorted(p.name for p in output_dir.glob("*.md")) == ["page_004.md", "page_005.md", "page_006.md"]
+    assert (output_dir / "page_005.md").read_text(encoding="utf-8") == "text of page_005.png"
+    assert not (output_dir / ocr.BATCH_STAGING_DIR_NAME).exists()
+
+
+def test_normalize_markdown_files_only_touches_target_page(tmp_path):
+    import ocr
+
+    names = ("scan_page_004_p1.md", "scan_page_004_p2.md", "scan_page_14_p1.md", "page_003.md", "page_004_p03.md")
+    for name in names:
+        (tmp_path / name).write_text(name, encoding="utf-8")
+
+    md_files = ocr.normalize_markdown_files(tmp_path, target_page=4)
+
+    assert sorted(md_files) == sorted(ocr.list_page_markdown(tmp_path, 4))
+
+    assert sorted(p.name for p in tmp_path.glob("*.md")) == [
+        "page_003.md",
+        "page_004.md",
+        "page_004_p02.md",
+        "page_004_p03.md",
+        "scan_page_14_p1.md",
+    ]
+
+
+def test_run_batch_parallel_pages_keep_their_own_logs(tmp_path, monkeypatch):
+    import sys
+    import threading
+
+    import ocr
+
+    real_run = subprocess.run
+    # 2 ページが実際に同時に走っていることを保証する
+    barrier = threading.Barrier(2, timeout=10)
+
+    def fake_run(cmd, **kwargs):
+        barrier.wait()
+        return real_run(cmd, **kwargs)
+
+    monkeypatch.setattr(ocr.subprocess, "run", fake_run)
+    monkeypatch.setattr(
+        ocr,
+        "build_command",
+        lambda image_path, output_dir, options: [sys.executable, "-c", f"print('output of {image_path.name}')"],
+    )
+    monkeypatch.setattr(ocr, "_postprocess_page", lambda *args, **kwargs: None)
+
+    images = []
+    for name in ("scan_a.png", "scan_b.png"):
+        path = tmp_path / name
+        path.write_bytes(b"")
+        images.append(path)
+    output_dir = tmp_path / "result"
+
+    ocr.run_batch(images, output_dir, start_page=1, options=ocr.OcrOptions(max_workers=2))
+
+    log_1 = (output_dir / "ocr_page_001.log").read_text(encoding="utf-8")
+    log_2 = (output_dir / "ocr_page_002.log").read_text(encoding="utf-8")
+    assert "output of scan_a.png" in log_1
+    assert "scan_b.png" not in log_1
+    assert "output of scan_b.png" in log_2
+    assert "scan_a.png" not in log_2
+
+
+def test_run_batch_reports_each_page_in_order(tmp_path, monkeypatch):
+    import ocr
+
+    monkeypatch.setattr(ocr, "run_ocr", lambda *args, **kwargs: None)
+    monkeypatch.setattr(ocr, "_run_slab", lambda *args, **kwargs: None)
+
+    images = [tmp_path / f"scan_{i}.png" for i in range(3)]
+    for options in (ocr.OcrOptions(), ocr.OcrOptions(max_workers=2), ocr.OcrOptions(batch_size=2)):
+        done: list[int] = []
+        ocr.run_batch(images, tmp_path, start_page=4, options=options, on_page_done=done.append)
+        assert done == [4, 5, 6]
@@ -0,0 +1,55 @@
+def test_remove_figure_references_strips_all_names_in_one_pass(tmp_path):
+    import ocr
+
+    md_path = tmp_path / "page_002.md"
+    md_path.write_text(
+        "![](./figures/fig_page002_01.png)\n"
+        '<img src="figures/fig_page002_02.png" width="10">\n'
+        "![](./figures/fig_page002_03.png)\n",
+        encoding="utf-8",
+    )
+    untouched = tmp_path / "page_003.md"
+    untouched.write_text("![](./figures/fig_page002_01.png)\n", encoding="utf-8")
+
+    ocr.remove_figure_references(tmp_path, 2, ["fig_page002_01.png", "fig_page002_02.png"])
+
+    assert md_path.read_text(encoding="utf-8") == "\n\n![](./figures/fig_page002_03.png)\n"
+    assert untouched.read_text(encoding="utf-8") == "![](./figures/fig_page002_01.png)\n"
+
+
+def test_update_markdown_figure_links_rewrites_every_link_form(tmp_path, monkeypatch):
+    import ocr
+
+    monkeypatch.setattr(ocr, "clean_markdown", lambda text: text)
+    md_path = tmp_path / "page_001.md"
+    md_path.write_text(
+        '<img src="figures/page_001_figure_0.png">\n'
+        "![](./figures/page_001_figure_1.png)\n"
+        "![](page_001_figure_10.png)\n"
+        "raw figures/page_001_figure_1.png\n",
+        encoding="utf-8",
+    )
+    mapping = {
+        "page_001_figure_0.png": "fig_page001_01.png",
+        "page_001_figure_1.png": "fig_page001_02.png",
+        "page_001_figure_10.png": "fig_page001_03.png",
+    }
+
+    ocr._update_markdown_figure_links(tmp_path, 1, mapping)
+
+    assert md_path.read_text(encoding="utf-8") == (
+        "![](./figures/fig_page001_01.png)\n"
+        "![](./figures/fig_page001_02.png)\n"
+        "![](./figures/fig_page001_03.png)\n"
+        "raw ./figures/fig_page001_02.png\n"
+    )
+
+
+def test_markdown_filters_pass_through_text_without_triggers():
+    import ocr
+
+    plain = "本文のみ <b>太字</b>\n"
+    assert ocr._img_tag_to_markdown(plain) is plain
+    assert ocr._sanitize_math(plain) is plain
+    assert ocr._img_tag_to_markdown('<Img src="figures/a.png">') == "![](figures/a.png)"
+    assert ocr._sanitize_math(r"式 \(a\-1\)") == "式 $a-1$"
@@ -8,6 +8,9 @@ def test_rename_figure_assets_overwrites_existing(tmp_path, monkeypatch):
     # 既存の正規化済みファイルがある状態（Windows だと rename が FileExistsError になる）
     stale = figure_dir / "fig_page001_01.png"
     stale.write_text("stale", encoding="utf-8")
+    # 今回は図版が 1 枚なので、2 枚目の古いファイルは上書きされず削除される
+    extra_stale = figure_dir / "fig_page001_02.png"
+    extra_stale.write_text("stale", encoding="utf-8")
 
     raw = figure_dir / "page_images_page_001_p1_figure_0.png"
     raw.write_text("new", encoding="utf-8")
@@ -23,6 +26,7 @@ def test_rename_figure_assets_overwrites_existing(tmp_path, monkeypatch):
     ocr.rename_figure_assets(output_dir, 1, icon_config=None, page_metrics=None)
 
     assert not raw.exists()
+    assert not extra_stale.exists()
     assert (figure_dir / "fig_page001_01.png").read_text(encoding="utf-8") == "new"
     assert "./figures/fig_page001_01.png" in md_path.read_text(encoding="utf-8")
 
@@ -0,0 +1,57 @@
+import numpy as np
+from PIL import Image
+
+import ocr
+
+PAGE = ocr.PageMetrics(width=1000, height=1000, area=1_000_000)
+
+
+def test_collect_figure_stats_two_tone_icon():
+    arr = np.where(np.arange(1600).reshape(40, 40) % 3 == 0, 0, 255).astype(np.uint8)
+    stats = ocr.collect_figure_stats(Image.fromarray(arr).convert("RGB"), ocr.IconFilterConfig(), PAGE)
+
+    assert stats["unique_colors"] == 2
+    assert stats["dominant_ratio"] == 0.6663
+    assert stats["avg_std"] == 120.2457
+    assert stats["mean_luma"] == 169.8938
+    assert stats["non_white_ratio"] == 0.3337
+    assert stats["area_ratio"] == 0.0016
+
+
+def test_collect_figure_stats_too_many_colors_reports_zero():
+    arr = np.random.default_rng(0).integers(0, 255, (120, 90, 3), dtype=np.uint8)
+    stats = ocr.collect_figure_stats(Image.fromarray(arr), ocr.IconFilterConfig(), PAGE)
+
+    assert stats["unique_colors"] == 0
+    assert stats["dominant_ratio"] == 0.0
+    assert (stats["width"], stats["height"]) == (90, 120)
+
+
+def test_remove_icon_figures_skips_stats_for_oversized_figures(tmp_path, monkeypatch):
+    figure_dir = tmp_path / "figures"
+    figure_dir.mkdir()
+    Image.new("RGB", (600, 400), "white").save(figure_dir / "fig_page001_01.png")
+
+    def fail(*args, **kwargs):
+        raise AssertionError("collect_figure_stats should not run")
+
+    monkeypatch.setattr(ocr, "collect_figure_stats", fail)
+    ocr.remove_icon_figures(tmp_path, 1, ocr.IconFilterConfig(), PAGE)
+
+    assert (figure_dir / "fig_page001_01.png").exists()
+
+
+def test_remove_icon_figures_skips_stats_when_nothing_can_change(tmp_path, monkeypatch):
+    figure_dir = tmp_path / "figures"
+    figure_dir.mkdir()
+    Image.new("RGB", (8, 8), "white").save(figure_dir / "fig_page001_01.png")
+
+    def fail(*args, **kwargs):
+        raise AssertionError("stats should not be computed")
+
+    monkeypatch.setattr(ocr, "collect_figure_stats", fail)
+    config = ocr.IconFilterConfig(policy="keep", log_candidates=False)
+
+    ocr.remove_icon_figures(tmp_path, 1, config)
+
+    assert (figure_dir / "fig_page001_01.png").exists()
@@ -0,0 +1,54 @@
+def test_cached_page_count_reuses_pdfinfo_until_file_changes(tmp_path, monkeypatch):
+    import os
+
+    import pdf2image
+
+    from pdf_pages import cached_page_count
+
+    calls = []
+
+    def fake_pdfinfo(path, poppler_path=None):
+        calls.append(path)
+        return {"Pages": 7}
+
+    monkeypatch.setattr(pdf2image, "pdfinfo_from_path", fake_pdfinfo)
+
+    pdf_path = tmp_path / "doc.pdf"
+    pdf_path.write_bytes(b"%PDF-1.4")
+    cache_path = tmp_path / "cache" / "pdfinfo.json"
+
+    assert cached_page_count(pdf_path, tmp_path, cache_path) == 7
+    assert cached_page_count(pdf_path, tmp_path, cache_path) == 7
+    assert len(calls) == 1
+
+    stat = pdf_path.stat()
+    os.utime(pdf_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+    assert cached_page_count(pdf_path, tmp_path, cache_path) == 7
+    assert len(calls) == 2
+
+
+def test_scratch_page_dir_keeps_yomitoku_json_names_stable(tmp_path):
+    from math_snippet_extractor import JSON_PATTERN
+    from pdf_pages import scratch_page_dir
+
+    page_image_dir = tmp_path / "result" / "page_images"
+    shm = tmp_path / "shm"
+    shm.mkdir()
+
+    scratch = scratch_page_dir(page_image_dir, shm=shm)
+
+    assert scratch.is_dir()
+    assert scratch.parent.parent == shm
+    # YomiToku の出力名: <親ディレクトリ名>_<stem>_p1.json
+    img_path = scratch / "page_001.png"
+    json_name = f"{img_path.parent.name}_{img_path.stem}_p1.json"
+    assert json_name == "page_images_page_001_p1.json"
+    match = JSON_PATTERN.search(json_name)
+    assert match and match.group(1) == "001"
+
+
+def test_scratch_page_dir_falls_back_without_shm(tmp_path):
+    from pdf_pages import scratch_page_dir
+
+    page_image_dir = tmp_path / "page_images"
+    assert scratch_page_dir(page_image_dir, shm=tmp_path / "missing") == page_image_dir
@@ -20,6 +20,10 @@ class PlainTextTests(unittest.TestCase):
         md = "数学$mathematics$ と $x+y$"
         self.assertEqual(to_plain_text(md), "数学mathematics と x+y")
 
+    def test_html_tags_are_dropped_but_unclosed_brackets_kept(self) -> None:
+        md = "<span>a</span> < b <c"
+        self.assertEqual(to_plain_text(md), "a < b <c")
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,18 @@
+def test_write_merged_md_joins_parts_and_numbers_issue_lines_per_page(tmp_path):
+    import postprocess
+
+    (tmp_path / "page_001.md").write_text("\n本文\n", encoding="utf-8")
+    (tmp_path / "page_001_p02.md").write_text("  \n", encoding="utf-8")
+    (tmp_path / "page_001_p03.md").write_text("前文\n比率 = 1/2\n", encoding="utf-8")
+    (tmp_path / "page_002.md").write_text("価格 $x$ と $y$\n", encoding="utf-8")
+    output = tmp_path / "out" / "merged.md"
+
+    issues = postprocess.write_merged_md(postprocess.collect_md_files(tmp_path), output)
+
+    assert output.read_text(encoding="utf-8") == (
+        "# Page 1\n\n本文\n\n前文\n比率 = 1/2\n\n\n# Page 2\n\n価格 $x$ と $y$\n\n"
+    )
+    assert [(i.page, i.line, i.reason) for i in issues] == [
+        (1, 4, "fraction_like"),
+        (2, 1, "noisy_dollar"),
+    ]
@@ -4,6 +4,7 @@ from __future__ import annotations
 
 import subprocess
 import sys
+from functools import lru_cache
 from pathlib import Path
 
 
@@ -11,13 +12,18 @@ class TextPdfError(RuntimeError):
     pass
 
 
-def convert_with_markitdown(pdf_path: Path, output_path: Path | None = None) -> Path:
-    if not pdf_path.exists():
-        raise TextPdfError(f"PDF ファイルが見つかりません: {pdf_path}")
+@lru_cache(maxsize=1)
+def _markitdown():
+    """MarkItDown インスタンスを 1 度だけ生成して使い回す（未インストールなら None）。"""
+
+    try:
+        from markitdown import MarkItDown
+    except ImportError:
+        return None
+    return MarkItDown()
 
-    output_path = output_path or pdf_path.with_suffix(".md")
-    output_path.parent.mkdir(parents=True, exist_ok=True)
 
+def _convert_with_cli(pdf_path: Path, output_path: Path) -> None:
     cmd = [
         sys.executable,
         "-m",
@@ -32,6 +38,26 @@ def convert_with_markitdown(pdf_path: Path, output_path: Path | None = None) ->
     except subprocess.CalledProcessError as exc:  # pragma: no cover
         raise TextPdfError(f"markitdown の実行に失敗しました: {exc}") from exc
 
+
+def convert_with_markitdown(pdf_path: Path, output_path: Path | None = None) -> Path:
+    if not pdf_path.exists():
+        raise TextPdfError(f"PDF ファイルが見つかりません: {pdf_path}")
+
+    output_path = output_path or pdf_path.with_suffix(".md")
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+
+    # プロセス内で変換できればインタプリタ起動と依存の再 import を省ける。
+    # import できない環境では従来どおり CLI をサブプロセスで呼ぶ。
+    converter = _markitdown()
+    if converter is None:
+        _convert_with_cli(pdf_path, output_path)
+        return output_path
+
+    try:
+        result = converter.convert(str(pdf_path))
+    except Exception as exc:  # pragma: no cover
+        raise TextPdfError(f"markitdown の実行に失敗しました: {exc}") from exc
+    output_path.write_text(result.markdown, encoding="utf-8")
     return output_path
 
 
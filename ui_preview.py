@@ -5,33 +5,33 @@ import base64
 import io
 import json
 import os
-import sys
 import tempfile
 from pathlib import Path
 
+from pdf_pages import cached_page_count, import_pymupdf, resolve_poppler_path
 
-def resolve_poppler_path(base_dir: Path) -> Path:
-    system = sys.platform
-    candidates: list[Path] = []
+# プレビューはページ移動のたびに別プロセスで起動されるので、ページ数はファイルに覚えておく
+PDFINFO_CACHE_PATH = Path(tempfile.gettempdir()) / "ocr_to_doc_pdfinfo_cache.json"
+PREVIEW_DPI = 150
 
-    if system.startswith("win"):
-        candidates.append(base_dir / "poppler" / "win" / "bin")
-        candidates.append(base_dir / "poppler" / "Library" / "bin")  # legacy 互換
-    elif system == "darwin":
-        candidates.append(base_dir / "poppler" / "macos" / "bin")
-        candidates.append(Path("/opt/homebrew/opt/poppler/bin"))
-        candidates.append(Path("/usr/local/opt/poppler/bin"))
-    else:
-        candidates.append(base_dir / "poppler" / system / "bin")
 
-    for path in candidates:
-        if path.exists():
-            return path
+def _render_page_pymupdf(input_path: Path, page: int):
+    """PyMuPDF があれば pdfinfo / pdftoppm を起動せずプロセス内で 1 ページ描画する。
 
-    raise FileNotFoundError(
-        "Poppler バイナリが見つかりません。OS ごとの bin ディレクトリを用意するか、"
-        "Homebrew / Choco などでインストールして PATH を設定してください。"
-    )
+    戻り値は (画像, 総ページ数, 補正後のページ番号)。PyMuPDF が無ければ None。
+    """
+
+    pymupdf = import_pymupdf()
+    if pymupdf is None:
+        return None
+    from PIL import Image
+
+    with pymupdf.open(str(input_path)) as doc:
+        page_count = doc.page_count
+        page = max(1, min(page, page_count))
+        pix = doc.load_page(page - 1).get_pixmap(dpi=PREVIEW_DPI, alpha=False)
+        img = Image.frombytes("RGB", (pix.width, pix.height), pix.samples)
+    return img, page_count, page
 
 
 CropRect = tuple[float, float, float, float]
@@ -76,13 +76,33 @@ def resize_long_edge(img, max_long_edge: int):
         return img
     scale = max_long_edge / long_edge
     new_size = (max(1, int(round(w * scale))), max(1, int(round(h * scale))))
-    return img.resize(new_size)
+    from PIL import Image
+
+    # プレビュー用の縮小なので、既定の BICUBIC より約 2 倍速い BILINEAR で十分。
+    # reducing_gap を付けると、大きく縮める場合は先に整数倍の reduce（ボックス平均）で粗く縮めてから仕上げる
+    return img.resize(new_size, Image.Resampling.BILINEAR, reducing_gap=2.0)
+
+
+def exif_transpose(img):
+    """EXIF の向きを反映する。回転不要なら（PDF の描画結果など）コピーを作らない。"""
+
+    from PIL import ImageOps
+
+    try:
+        ImageOps.exif_transpose(img, in_place=True)
+    except TypeError:
+        # in_place は Pillow 9.4 以降
+        return ImageOps.exif_transpose(img)
+    return img
 
 
 def image_to_data_url(img) -> str:
     buf = io.BytesIO()
-    img.save(buf, format="PNG", optimize=True)
-    b64 = base64.b64encode(buf.getvalue()).decode("ascii")
+    # プレビューは使い捨てなので optimize（zlib 最大圧縮＋フィルタ探索）はせず、最速の圧縮で書く
+    img.save(buf, format="PNG", compress_level=1)
+    # getbuffer は BytesIO の中身をコピーせずに渡せる
+    with buf.getbuffer() as data:
+        b64 = base64.b64encode(data).decode("ascii")
     return f"data:image/png;base64,{b64}"
 
 
@@ -102,7 +122,7 @@ def main() -> None:
     crop = parse_crop(args.crop)
 
     try:
-        from PIL import Image, ImageOps
+        from PIL import Image
     except ImportError as exc:
         raise SystemExit(f"Pillow is required: {exc}") from exc
 
@@ -110,25 +130,29 @@ def main() -> None:
     page = args.page
 
     if input_path.suffix.lower() == ".pdf":
-        from pdf2image import convert_from_path, pdfinfo_from_path
-
-        poppler_path = resolve_poppler_path(base_dir)
-        os.environ["PATH"] = str(poppler_path) + os.pathsep + os.environ.get("PATH", "")
-
-        info = pdfinfo_from_path(str(input_path), poppler_path=str(poppler_path))
-        page_count = int(info["Pages"])
-        page = max(1, min(page, page_count))
-
-        images = convert_from_path(
-            str(input_path),
-            dpi=150,
-            first_page=page,
-            last_page=page,
-            fmt="png",
-            poppler_path=str(poppler_path),
-        )
-        img = images[0]
-        img = ImageOps.exif_transpose(img)
+        rendered = _render_page_pymupdf(input_path, page)
+        if rendered is not None:
+            img, page_count, page = rendered
+        else:
+            from pdf2image import convert_from_path
+
+            poppler_path = resolve_poppler_path(base_dir)
+            if str(poppler_path) not in os.environ.get("PATH", "").split(os.pathsep):
+                os.environ["PATH"] = str(poppler_path) + os.pathsep + os.environ.get("PATH", "")
+
+            page_count = cached_page_count(input_path, poppler_path, PDFINFO_CACHE_PATH)
+            page = max(1, min(page, page_count))
+
+            images = convert_from_path(
+                str(input_path),
+                dpi=PREVIEW_DPI,
+                first_page=page,
+                last_page=page,
+                fmt="png",
+                poppler_path=str(poppler_path),
+            )
+            img = images[0]
+        img = exif_transpose(img)
         img = apply_crop(img, crop)
         img = resize_long_edge(img, args.max_long_edge)
         data_url = image_to_data_url(img)
@@ -138,7 +162,7 @@ def main() -> None:
         with tempfile.TemporaryDirectory(prefix="ocr_to_doc_preview_") as tmp:
             conversion = ensure_png_image(input_path, convert_dir=Path(tmp))
             with Image.open(conversion.converted) as img:
-                img = ImageOps.exif_transpose(img)
+                img = exif_transpose(img)
                 img = apply_crop(img, crop)
                 img = resize_long_edge(img, args.max_long_edge)
                 data_url = image_to_data_url(img)